@@ -0,0 +1,148 @@
+#!/usr/bin/python
+'''
+Benchmark the matching of highlight rects to the text under them.
+
+Compares, on the pages of a given PDF:
+
+- scan: findStrFromBox() scanning lines and chars of each box.
+- index: findStrFromBox() with a BoxIndex per box (bisect range queries).
+- numpy: findStrFromBox() with a PageArrays per page (one broadcast of
+  all chars against all highlights, see benchmarks/pagearrays.py).
+
+Highlights are made from the text lines of each page: every <step>-th
+line is highlighted, from a random char to the line end. Results of the
+engines are checked to be identical. Layout analysis is done once before
+timing.
+
+Usage:
+
+    python benchmarks/overlap.py [-s STEP] [-n RUNS] file.pdf
+
+
+# Copyright 2016 Guang-zhi XU
+#
+# This file is distributed under the terms of the
+# GPLv3 licence. See the LICENSE file for details.
+# You may use, distribute and modify this code under the
+# terms of the GPLv3 license.
+
+Update time: 2026-10-18 15:58:21.
+'''
+
+import sys,os
+import argparse
+import random
+import timeit
+
+sys.path.insert(0,os.path.join(os.path.dirname(os.path.dirname(\
+        os.path.abspath(__file__))),'lib'))
+
+import extracthl2
+from pageindex import BoxIndex, overlaps
+from pagearrays import PageArrays
+from pdfminer.layout import LTTextBox, LTTextBoxHorizontal, LTTextLineHorizontal
+
+
+
+#--------------Make highlights from text lines--------------
+def makeHighlights(boxes,step,page):
+    annos=[]
+    ii=0
+    for box in boxes:
+        for line in box._objs:
+            if type(line)!=LTTextLineHorizontal:
+                continue
+            ii+=1
+            if ii%step!=0:
+                continue
+            x0=random.uniform(line.x0,line.x1)
+            annos.append({'rect':[x0,line.y0+1,line.x1,line.y1-1],\
+                    'cdate':None,'page':page})
+    return annos
+
+
+#--------------Match all highlights of a page--------------
+def matchPage(boxes,annos,engine):
+    rects=[hii['rect'] for hii in annos]
+    under=[box for box in boxes if any(overlaps(box.bbox,rii) for rii in rects)]
+
+    if engine=='scan':
+        return [extracthl2.findStrFromBox(annos,box) for box in under]
+    elif engine=='index':
+        return [extracthl2.findStrFromBox(annos,box,\
+                index=BoxIndex(box,extracthl2.sortY(box._objs)))\
+                for box in under]
+    else:
+        arrays=PageArrays([(box,extracthl2.sortY(box._objs)) for box in under],\
+                rects)
+        return [extracthl2.findStrFromBox(annos,box,index=view)\
+                for box,view in zip(under,arrays.views)]
+
+
+
+
+#-----------------Main-----------------
+def main(filename,step,runs):
+
+    random.seed(0)
+
+    #--------------Analyse layout once--------------
+    document,interpreter,device=extracthl2.init(filename)
+    pages=[]
+    for ii,page in enumerate(extracthl2.PDFPage.create_pages(document)):
+        interpreter.process_page(page)
+        layout=device.get_result()
+        boxes=[obj for obj in layout._objs if type(obj)==LTTextBox or\
+                type(obj)==LTTextBoxHorizontal]
+        annos=makeHighlights(boxes,step,ii+1)
+        if len(annos)==0:
+            continue
+        annos=extracthl2.sortAnnoY(extracthl2.mergeLine(annos))
+        pages.append((boxes,annos))
+
+    nhl=sum([len(aa) for bb,aa in pages])
+    nchar=sum([len(line._objs) for bb,aa in pages for box in bb for line in box._objs\
+            if type(line)==LTTextLineHorizontal])
+    print('%d pages, %d highlights, %d chars' %(len(pages),nhl,nchar))
+    if len(pages)==0:
+        return 1
+
+    #-------------------Check results-------------------
+    expected=[matchPage(bb,aa,'scan') for bb,aa in pages]
+    for engine in ['index','numpy']:
+        if [matchPage(bb,aa,engine) for bb,aa in pages]!=expected:
+            raise Exception("Results of %s differ from scan." %engine)
+
+    #-----------------------Time-----------------------
+    base=None
+    for engine in ['scan','index','numpy']:
+        times=[]
+        for ii in range(runs):
+            t0=timeit.default_timer()
+            for bb,aa in pages:
+                matchPage(bb,aa,engine)
+            times.append(timeit.default_timer()-t0)
+        best=min(times)
+        if base is None:
+            base=best
+        print('%-8s %8.1f ms   x%.1f' %(engine,best*1e3,base/best))
+
+    return 0
+
+
+
+
+if __name__=='__main__':
+
+    parser=argparse.ArgumentParser(description=\
+            'Benchmark matching of highlights to text in a PDF.')
+
+    parser.add_argument('pdf',type=str,help='PDF file to use.')
+    parser.add_argument('-s','--step',type=int,default=2,
+            help='Highlight every STEP-th text line (default 2).')
+    parser.add_argument('-n','--runs',type=int,default=5,
+            help='Number of runs per engine (default 5).')
+
+    args=parser.parse_args()
+
+    sys.exit(main(args.pdf,max(1,args.step),args.runs))
@@ -0,0 +1,162 @@
+'''
+NumPy engine matching highlights to text, for benchmarks/overlap.py.
+
+PageArrays flattens the lines and chars of the boxes of a page under
+highlights into NumPy arrays, and tests them against all the highlight
+rects of the page in one broadcast. Its per-box views answer the same
+queries as BoxIndex (see lib/pageindex.py), from the precomputed overlap
+matrices.
+
+It is kept here for comparison only: on the tested PDFs it is slower
+than BoxIndex, which extractHighlights() uses.
+
+
+# Copyright 2016 Guang-zhi XU
+#
+# This file is distributed under the terms of the
+# GPLv3 licence. See the LICENSE file for details.
+# You may use, distribute and modify this code under the
+# terms of the GPLv3 license.
+
+Update time: 2026-10-18 19:40:12.
+'''
+
+import numpy as np
+
+from pdfminer.layout import LTTextLine, LTTextLineHorizontal, LTChar, LTAnno
+from pageindex import overlaps
+
+
+# Bbox of LTAnno objs, which never overlaps
+NOBOX=(np.inf,np.inf,-np.inf,-np.inf)
+
+
+
+def overlapMatrix(bboxes,rects):
+    '''Test overlaps of boxes against rects in one broadcast
+
+    <bboxes>: (N,4) ndarray, [x0,y0,x1,y1] of boxes.
+    <rects>: (M,4) ndarray, [x1,y1,x2,y2] of highlights.
+
+    Return <result>: (N,M) bool ndarray, True where box overlaps rect,
+                     ends included.
+    '''
+    b=bboxes[:,None,:]
+    r=rects[None,:,:]
+    return (r[...,0]<=b[...,2]) & (b[...,0]<=r[...,2]) &\
+            (r[...,1]<=b[...,3]) & (b[...,1]<=r[...,3])
+
+
+
+class PageArrays(object):
+
+    def __init__(self,boxes,rects):
+        '''Overlaps of the lines and chars in a page with all highlights.
+
+        <boxes>: list of (box, lines) tuples, <box> a LTTextBox obj,
+                 <lines> the objs in <box> in reading order (see sortY()
+                 in readorder.py).
+        <rects>: list, [x1,y1,x2,y2] of the highlights in the page.
+
+        Line and char bboxes of all <boxes> are stacked into (L,4) and
+        (N,4) arrays, and tested against the (M,4) array of <rects> at
+        once. Chars of a line are stacked in the order of the line, with
+        LTAnno objs (no bbox) marked as always overlapping, so the text
+        under a rect is a masked slice of the stacked texts.
+        '''
+
+        self.rects=rects
+        # Column of each rect in the overlap matrices
+        self._cols={}
+        for ii,rii in enumerate(rects):
+            self._cols.setdefault(tuple(rii),ii)
+
+        self.views=[]
+        linebbs=[]
+        charbbs=[]
+        self.texts=[]
+        self._starts=[]   # first and last+1 rows of each line in chars
+
+        for box,lines in boxes:
+            linepos=[ii for ii,lii in enumerate(lines) if\
+                    type(lii)==LTTextLine or type(lii)==LTTextLineHorizontal]
+            view=BoxArrays(self,box,lines,linepos,len(linebbs))
+            for ii in linepos:
+                lineii=lines[ii]
+                linebbs.append(lineii.bbox)
+                objs=[cjj for cjj in lineii._objs if type(cjj)==LTChar or\
+                        type(cjj)==LTAnno]
+                start=len(charbbs)
+                # LTAnno has no bbox, NOBOX never overlaps
+                charbbs.extend([cjj.bbox if type(cjj)==LTChar else NOBOX\
+                        for cjj in objs])
+                self.texts.extend([cjj.get_text() for cjj in objs])
+                self._starts.append((start,len(charbbs)))
+            self.views.append(view)
+
+        rects=np.array(rects,dtype='float').reshape(-1,4)
+        linebbs=np.array(linebbs,dtype='float').reshape(-1,4)
+        charbbs=np.array(charbbs,dtype='float').reshape(-1,4)
+
+        self.lineover=overlapMatrix(linebbs,rects)
+        self.charover=overlapMatrix(charbbs,rects)
+        self.charover[charbbs[:,0]==np.inf]=True
+
+
+    def col(self,rect):
+        return self._cols[tuple(rect)]
+
+
+
+class BoxArrays(object):
+
+    def __init__(self,page,box,lines,linepos,offset):
+        '''View of a box in a PageArrays obj, with the queries of BoxIndex.
+
+        <page>: PageArrays obj.
+        <box>: LTTextBox obj.
+        <lines>: list, objs in <box>, in reading order.
+        <linepos>: list, positions of text lines in <lines>.
+        <offset>: int, row of the 1st text line of <box> in the stacked
+                  line array of <page>.
+
+        Rects passed to the queries must be among the rects of <page>.
+        '''
+        self.page=page
+        self.box=box
+        self.bbox=box.bbox
+        self.lines=lines
+        self.linepos=linepos
+        self.offset=offset
+        # Row in the stacked lines of each text line, keys: position
+        self._rows=dict([(ii,offset+kk) for kk,ii in enumerate(linepos)])
+
+
+    def overlaps(self,rect):
+        '''Check if <rect> overlaps the box
+        '''
+        return overlaps(self.bbox,rect)
+
+
+    def findLines(self,rect):
+        '''Find text lines overlapping <rect>
+
+        Return <result>: list of ints, positions in <lines> of the
+                         overlapping lines, in the order of <lines>.
+        '''
+        col=self.page.col(rect)
+        over=self.page.lineover[self.offset:self.offset+len(self.linepos),col]
+        return [self.linepos[kk] for kk in np.flatnonzero(over)]
+
+
+    def lineText(self,ii,rect):
+        '''Get texts in a line under <rect>
+
+        Return <texts>: list of strs, see BoxIndex.lineText().
+        '''
+        col=self.page.col(rect)
+        start,end=self.page._starts[self._rows[ii]]
+        over=self.page.charover[start:end,col]
+        texts=self.page.texts
+        return [texts[start+kk] for kk in np.flatnonzero(over)]
+
@@ -0,0 +1,124 @@
+#!/usr/bin/python
+'''
+Benchmark the start-up time of Menotexport.
+
+Each measurement runs in a fresh interpreter, so that module import costs
+are included, as they are for every CLI run and GUI start.
+
+Usage:
+
+    python benchmarks/startup.py [-n N] [dbfile]
+
+- import: time to import menotexport.
+- import+pandas: same, plus importing pandas, i.e. the cost the DB layer
+  paid before it was moved off pandas. Skipped if pandas is not installed.
+- listing: if <dbfile> is given, also connect to it and list folders,
+  folder docs and canonical docs, as main() does before processing.
+
+
+# Copyright 2016 Guang-zhi XU
+#
+# This file is distributed under the terms of the
+# GPLv3 licence. See the LICENSE file for details.
+# You may use, distribute and modify this code under the
+# terms of the GPLv3 license.
+
+Update time: 2026-10-18 11:40:08.
+'''
+
+import sys,os
+import argparse
+import subprocess
+import timeit
+
+ROOT=os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+_IMPORT='import menotexport'
+
+_IMPORT_PANDAS='import menotexport; import pandas'
+
+_LISTING='''import menotexport
+db=menotexport.mendeleydb.MendeleyDB(%r,readonly=True)
+folders=menotexport.getFolderList(db,None)
+for fid,fname in folders:
+    menotexport.getFolderDocList(db,fid)
+menotexport.getCanonicals(db)
+db.close()
+'''
+
+
+
+#---------Time a statement in a new interpreter---------
+def timeFresh(stmt,n):
+    '''Run <stmt> in <n> fresh interpreters
+
+    <stmt>: str, python code to run.
+    <n>: int, number of runs.
+
+    Return <times>: list of floats, wall time of each run in seconds,
+                    including interpreter start-up.
+    '''
+
+    cmd=[sys.executable,'-c',stmt]
+    times=[]
+    for ii in range(n):
+        t0=timeit.default_timer()
+        proc=subprocess.Popen(cmd,cwd=ROOT,stdout=subprocess.PIPE,
+                stderr=subprocess.PIPE)
+        out,err=proc.communicate()
+        times.append(timeit.default_timer()-t0)
+        if proc.returncode!=0:
+            raise Exception("Benchmark statement failed:\n%s" %err)
+    return times
+
+
+def report(label,times):
+    times=sorted(times)
+    print('%-16s min %7.1f ms   median %7.1f ms' %(label,
+        times[0]*1e3,times[len(times)//2]*1e3))
+
+
+def hasModule(name):
+    try:
+        timeFresh('import %s' %name,1)
+        return True
+    except Exception:
+        return False
+
+
+
+
+#-----------------Main-----------------
+def main(dbfin,n):
+
+    #------------Interpreter alone, as a floor------------
+    report('python',timeFresh('pass',n))
+    report('import',timeFresh(_IMPORT,n))
+
+    if hasModule('pandas'):
+        report('import+pandas',timeFresh(_IMPORT_PANDAS,n))
+    else:
+        print('%-16s skipped, pandas not installed' %'import+pandas')
+
+    if dbfin is not None:
+        report('listing',timeFresh(_LISTING %os.path.abspath(dbfin),n))
+
+    return 0
+
+
+
+
+if __name__=='__main__':
+
+    parser=argparse.ArgumentParser(description=\
+            'Benchmark the start-up time of Menotexport.')
+
+    parser.add_argument('dbfile',type=str,nargs='?',default=None,
+            help='Optional Mendeley sqlite database, to also time the\
+            folder and doc listings.')
+    parser.add_argument('-n','--runs',type=int,default=10,
+            help='Number of runs per measurement (default 10).')
+
+    args=parser.parse_args()
+
+    sys.exit(main(args.dbfile,args.runs))
@@ -0,0 +1,113 @@
+'''pdfminer device keeping only the text under highlights.
+
+PDFPageAggregator builds a LTChar for every glyph of a page, and the
+layout analysis then groups all of them into lines and boxes, although
+highlight extraction only reads the chars under the highlight rects.
+
+ClipAggregator is given the highlight rects of a page before the page is
+processed. For each glyph, it computes the y range the LTChar would
+have, and only builds and keeps the LTChar if it falls in the horizontal
+band around some rect. The layout analysis then only groups the kept
+chars.
+
+Text lines under highlights are the same as with a full layout, but text
+boxes are cut at the band edges. Highlights of the same paragraph that
+are more than a few lines apart may so fall in different boxes, and be
+exported as separate highlights.
+
+
+# Copyright 2016 Guang-zhi XU
+#
+# This file is distributed under the terms of the
+# GPLv3 licence. See the LICENSE file for details.
+# You may use, distribute and modify this code under the
+# terms of the GPLv3 license.
+
+Update time: 2026-10-18 16:58:40.
+'''
+
+from pdfminer.converter import PDFPageAggregator
+
+
+# Height of the kept band above and below a rect, in rect heights
+MARGIN=3
+
+
+
+class ClipAggregator(PDFPageAggregator):
+
+    def __init__(self,rsrcmgr,pageno=1,laparams=None):
+        '''Page aggregator keeping only the chars near some rects.
+
+        <rsrcmgr>: PDFResourceManager obj.
+        <laparams>: LAParams obj, parameters of the layout analysis.
+
+        Set the rects of a page with setRects() before processing the
+        page. With no rects set, all chars are kept, as in
+        PDFPageAggregator.
+        '''
+        PDFPageAggregator.__init__(self,rsrcmgr,pageno=pageno,\
+                laparams=laparams)
+        self.bands=None
+        self.clipping=False
+
+
+    def setRects(self,rects):
+        '''Set the rects of the next page
+
+        <rects>: list, [x1,y1,x2,y2] of highlights, or None to keep all
+                 chars.
+
+        Chars are kept if they overlap the horizontal band of some rect,
+        widened by MARGIN times its height above and below, over the
+        whole page width. Whole lines are so kept, as their ends are
+        used to place line breaks between highlights. Overlapping bands
+        are merged.
+        '''
+        if rects is None:
+            self.bands=None
+            return
+
+        bands=[]
+        for x1,y1,x2,y2 in sorted(rects,key=lambda rii: rii[1]):
+            margin=MARGIN*(y2-y1)
+            y1,y2=y1-margin,y2+margin
+            if len(bands)>0 and y1<=bands[-1][1]:
+                bands[-1][1]=max(bands[-1][1],y2)
+            else:
+                bands.append([y1,y2])
+        self.bands=bands
+
+
+    def begin_page(self,page,ctm):
+        PDFPageAggregator.begin_page(self,page,ctm)
+        # No clipping if the bands cover the page
+        self.clipping=self.bands is not None and not any(\
+                bii[0]<=self.cur_item.y0 and self.cur_item.y1<=bii[1]\
+                for bii in self.bands)
+
+
+    def render_char(self,matrix,font,fontsize,scaling,rise,cid):
+
+        if not self.clipping or font.is_vertical():
+            return PDFPageAggregator.render_char(self,matrix,font,fontsize,\
+                    scaling,rise,cid)
+
+        #-------y range of the char, computed as in LTChar-------
+        a,b,c,d,e,f=matrix
+        ty=font.get_descent()*fontsize+rise
+        y0=d*ty+f
+        y1=d*(ty+font.get_height()*fontsize)+f
+        if b!=0:
+            # Skewed or rotated text, y depends on the advance too
+            y1+=b*font.char_width(cid)*fontsize*scaling
+        if y1<y0:
+            y0,y1=y1,y0
+
+        for bii in self.bands:
+            if y0<=bii[1] and bii[0]<=y1:
+                return PDFPageAggregator.render_char(self,matrix,font,\
+                        fontsize,scaling,rise,cid)
+
+        # Glyph outside all bands, only advance the text position
+        return font.char_width(cid)*fontsize*scaling
@@ -138,6 +138,66 @@ def _exportAnnoFile(abpath_out,anno,verbose=True):
     
 
     
+#-----------------Get the path of an output txt file-----------------
+def getOutFile(outdir,action,fname=None):
+    '''Get the path of an output txt file
+
+    <outdir>: str, path to output folder.
+    <action>: list, actions from cli arguments.
+    <fname>: str or None, name of a PDF, for the file of its annotations
+             only. If None, the file of annotations from all PDFs.
+
+    Return <abpath_out>: str, absolute path to the txt file, renamed if the
+                         file exists.
+    '''
+
+    if 'm' in action and 'n' not in action:
+        fileout='Highlights_%s.txt' if fname else 'Mendeley_highlights.txt'
+    elif 'n' in action and 'm' not in action:
+        fileout='Notes_%s.txt' if fname else 'Mendeley_notes.txt'
+    elif 'm' in action and 'n' in action:
+        fileout='Anno_%s.txt' if fname else 'Mendeley_annotations.txt'
+    if fname:
+        fileout=fileout %fname
+
+    abpath_out=os.path.join(outdir,fileout)
+    return tools.autoRename(abpath_out)
+
+
+#----------------Export highlights and/or notes of a PDF----------------
+def exportDocAnno(anno,outdir,action,abpath_out=None,verbose=True):
+    '''Export highlights and/or notes of a PDF to txt file
+
+    <anno>: FileAnno obj, with extracted highlights and notes.
+    <outdir>: str, path to output folder.
+    <action>: list, actions from cli arguments.
+    <abpath_out>: str or None, txt file to append to, as from getOutFile().
+                  If None, save to a file of this PDF only.
+
+    Return <annofaillist>: list, file name of the PDF if failed, else [].
+    '''
+
+    fii=anno.path
+    basenameii=os.path.basename(fii)
+    fnameii=os.path.splitext(basenameii)[0]
+
+    #---------Get individual output if needed---------
+    if abpath_out is None:
+        abpath_out=getOutFile(outdir,action,fnameii)
+
+        if verbose:
+            printInd('Exporting annotations to:',3)
+            printInd(abpath_out,4)
+
+    #----------------------Export----------------------
+    try:
+        _exportAnnoFile(abpath_out,anno)
+    except:
+        return [basenameii,]
+
+    return []
+
+
 #--------------------Export highlights and/or notes--------------------
 def exportAnno(annodict,outdir,action,separate,verbose=True):
     '''Export highlights and/or notes to txt file
@@ -150,25 +210,18 @@ def exportAnno(annodict,outdir,action,separate,verbose=True):
     <separate>: bool, True: save annotations if each PDF separately.
                       False: save annotations from all PDFs to a single file.
 
-    Calls _exportAnnoFile() for core processes.
+    Calls exportDocAnno() for each PDF.
     '''
 
     #-----------Export all to a single file-----------
     if not separate:
-            
-        if 'm' in action and 'n' not in action:
-            fileout='Mendeley_highlights.txt'
-        elif 'n' in action and 'm' not in action:
-            fileout='Mendeley_notes.txt'
-        elif 'm' in action and 'n' in action:
-            fileout='Mendeley_annotations.txt'
-
-        abpath_out=os.path.join(outdir,fileout)
-        abpath_out=tools.autoRename(abpath_out)
+        abpath_out=getOutFile(outdir,action)
 
         if verbose:
             printInd('Exporting all annotations to:',3)
             printInd(abpath_out,4)
+    else:
+        abpath_out=None
 
     #----------------Loop through files----------------
     annofaillist=[]
@@ -179,35 +232,14 @@ def exportAnno(annodict,outdir,action,separate,verbose=True):
     for ii,idii in enumerate(docids):
 
         annoii=annodict[idii]
-        fii=annoii.path
-        basenameii=os.path.basename(fii)
-        fnameii=os.path.splitext(basenameii)[0]
+        fnameii=os.path.splitext(os.path.basename(annoii.path))[0]
 
         if verbose:
             printNumHeader('Exporting annos in file',ii+1,num,3)
             printInd(fnameii,4)
 
-        #---------Get individual output if needed---------
-        if separate:
-            if 'm' in action and 'n' not in action:
-                fileout='Highlights_%s.txt' %fnameii
-            elif 'n' in action and 'm' not in action:
-                fileout='Notes_%s.txt' %fnameii
-            elif 'm' in action and 'n' in action:
-                fileout='Anno_%s.txt' %fnameii
-            abpath_out=os.path.join(outdir,fileout)
-            abpath_out=tools.autoRename(abpath_out)
-
-            if verbose:
-                printInd('Exporting annotations to:',3)
-                printInd(abpath_out,4)
-
-        #----------------------Export----------------------
-        try:
-            _exportAnnoFile(abpath_out,annoii)
-        except:
-            annofaillist.append(basenameii)
-            continue
+        annofaillist.extend(exportDocAnno(annoii,outdir,action,abpath_out,\
+                verbose))
 
     return annofaillist
 
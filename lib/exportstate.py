@@ -0,0 +1,154 @@
+'''State of previous exports, for incremental exports.
+
+Highlight extraction reads and analyses the PDFs, and is the slowest step
+of an export. In incremental mode, the highlights extracted from each
+doc are saved to a state file in the output folder, together with a
+fingerprint of the doc's highlights: their number, the latest creation
+time, a hash of their pages and rects, and the Mendeley file hash.
+
+On later runs, docs whose fingerprint has not changed reuse the saved
+texts instead of being extracted again. The title, citation key and tags
+attached to the texts are always taken from the current meta-data.
+
+Notes are read from the database only, and are not kept here.
+
+
+# Copyright 2016 Guang-zhi XU
+#
+# This file is distributed under the terms of the
+# GPLv3 licence. See the LICENSE file for details.
+# You may use, distribute and modify this code under the
+# terms of the GPLv3 license.
+
+Update time: 2026-10-18 16:32:05.
+'''
+
+import os
+import hashlib
+import tempfile
+try:
+    import cPickle as pickle
+except ImportError:
+    import pickle
+
+from layoutcache import EXTRACTOR_VERSION
+
+
+STATE_FILE='.menotexport_state'
+
+# Change this when the stored form changes
+STATE_VERSION='1'
+
+
+
+#-------------Fingerprint of the highlights in a doc-------------
+def fingerprint(anno):
+    '''Fingerprint of the highlights in a doc
+
+    <anno>: FileAnno obj, before extraction, with highlights as a dict of
+            page: list of highlights.
+
+    Return <result>: tuple, (number of highlights, latest creation time,
+                     sha1 of the sorted pages and rects, file hash).
+    '''
+
+    hls=[hii for pp in anno.hlpages for hii in anno.highlights[pp]]
+    ctimes=[hii['cdate'] for hii in hls if hii['cdate'] is not None]
+    rects=sorted([(hii['page'],tuple(hii['rect'])) for hii in hls])
+    rhash=hashlib.sha1(repr(rects)).hexdigest()
+
+    return (len(hls),max(ctimes) if len(ctimes)>0 else None,rhash,\
+            anno.filehash)
+
+
+
+
+class ExportState(object):
+
+    def __init__(self,outdir,method):
+        '''Highlights extracted in previous exports to <outdir>.
+
+        <outdir>: str, output folder of the export.
+        <method>: str, name of the extraction method (e.g. 'pdftotext' or
+                  'pdfminer'). Saved texts from another method or another
+                  EXTRACTOR_VERSION are discarded.
+
+        An unreadable state file is treated as empty.
+        '''
+
+        self.path=os.path.join(outdir,STATE_FILE)
+        self.header=(STATE_VERSION,EXTRACTOR_VERSION,method)
+        self.docs={}    #keys: docid, values: (fingerprint, texts)
+        self.used=set()
+        self.nreused=0
+
+        try:
+            with open(self.path,'rb') as fin:
+                header,docs=pickle.load(fin)
+            if header==self.header:
+                self.docs=docs
+        except Exception:
+            pass
+
+
+    def get(self,docid,fp,meta):
+        '''Get the saved highlights of a doc if its fingerprint is unchanged
+
+        <docid>: int, document id.
+        <fp>: tuple, fingerprint() of the doc.
+        <meta>: dict, current meta-data of the doc.
+
+        Return <hltexts>: list of Anno objs, or None if not saved or
+                          changed.
+        '''
+        from extracthl2 import Anno
+
+        entry=self.docs.get(docid)
+        if entry is None or entry[0]!=fp:
+            return None
+
+        self.used.add(docid)
+        self.nreused+=1
+        return [Anno(text,ctime=ctime,title=meta['title'],page=page,\
+                citationkey=meta['citationkey'],tags=meta['tags'])\
+                for text,ctime,page in entry[1]]
+
+
+    def put(self,docid,fp,hltexts):
+        '''Save the extracted highlights of a doc
+
+        <docid>: int, document id.
+        <fp>: tuple, fingerprint() of the doc.
+        <hltexts>: list of Anno objs, extracted highlights.
+        '''
+        self.used.add(docid)
+        self.docs[docid]=(fp,[(aii.text,aii.ctime,aii.page) for aii in hltexts])
+
+
+    def save(self,prune=False):
+        '''Write the state file
+
+        <prune>: bool, if True, drop docs not seen in this run. Only do
+                 this after a run over the whole library.
+
+        Failures to write are ignored, docs are then extracted again
+        next time.
+        '''
+        if prune:
+            self.docs=dict([(kk,vv) for kk,vv in self.docs.items()\
+                    if kk in self.used])
+        folder=os.path.dirname(self.path)
+        try:
+            fd,tmppath=tempfile.mkstemp(dir=folder)
+            with os.fdopen(fd,'wb') as fout:
+                pickle.dump((self.header,self.docs),fout,\
+                        pickle.HIGHEST_PROTOCOL)
+            if os.path.exists(self.path):
+                # os.rename() can't replace a file on Windows
+                os.remove(self.path)
+            os.rename(tmppath,self.path)
+        except Exception:
+            try:
+                os.remove(tmppath)
+            except Exception:
+                pass
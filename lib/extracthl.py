@@ -24,8 +24,8 @@ from pdfminer.layout import LAParams
 from pdfminer.converter import PDFPageAggregator
 from pdfminer.layout import LTTextBox, LTTextLine, LTAnno,\
         LTTextBoxHorizontal, LTTextLineHorizontal, LTChar
-from numpy import sqrt, argsort
 import wordfix
+from readorder import readingOrder, sortY, sortAnnoY
 
 
 
@@ -231,130 +231,6 @@ def checkJump(lastbox,curbox,curline,linegap,chargap):
     return False
 
 
-#-------------------------Fine tune box order-------------------------
-def fineTuneOrder(objs,verbose=True):
-    '''Fine tune box order
-
-    For a list of box objs that share similar x coordinates
-    of the top-left corner, sort using their y (+ve upwards)
-    coordinates so that larger y goes first.
-    '''
-
-    topleft=[(ii.bbox[0],ii.bbox[3]) for ii in objs]
-    objdict={}
-    for ii in objs:
-        objdict[ii.bbox[0],ii.bbox[3]]=ii
-
-    for ii in range(len(objs)-1):
-        x0,y0=topleft[ii]
-        x1,y1=topleft[ii+1]
-
-        if abs(x0-x1)<=30 and y1-y0>1:
-            topleft[ii]=(x1,y1)
-            topleft[ii+1]=(x0,y0)
-
-    result=[]
-    for ii in topleft:
-        result.append(objdict[ii])
-
-    return result
-
-
-
-
-#---------------------Sort box elements diagnoally---------------------
-def sortDiag(layout,verbose=True):
-    '''Sort box elements diagnoally
-
-    Sort the box objs in <layout> so that they follow the
-    reading order in 2-column PDFs: from top-down, from
-    left to right column.
-
-    Sort by measuring the perpendicular distance from the
-    topleft corner of a box to the line (y=2w/h*x+h, with origin
-    at bottom-left corner of page).
-    '''
-
-    dist=lambda x,y,w,h: abs(2.*h*x/w-y+h)/sqrt((2.*h/w)**2+1)
-
-    w=layout.width
-    h=layout.height
-
-    dists=[dist(jj.bbox[0],jj.bbox[3],w,h) for jj in layout._objs]
-    idx=argsort(dists)
-
-    objs=[layout._objs[ii] for ii in idx]
-
-    return objs
-
-
-
-
-#-------------------------Sort objs vertically-------------------------
-def sortY(objs,verbose=True):
-    '''Sort objs vertically
-
-    Sort objs with similar x coordinates by y coordinates
-    '''
-
-    objdict={}
-    for ii in objs:
-        objdict[-ii.bbox[3],ii.bbox[0]]=ii
-
-    keys=objdict.keys()
-    keys=sorted(keys)
-
-    result=[objdict[ii] for ii in keys]
-
-    return result
-
-
-
-
-#------------------------Sort objs horizontally------------------------
-def sortX(objs,verbose=True):
-    '''Sort objs horizontally
-
-    Sort objs with similar y coordinates by x coordinates
-    '''
-
-    objdict={}
-    for ii in objs:
-        objdict[ii.bbox[0],-ii.bbox[3]]=ii
-
-    keys=objdict.keys()
-    keys=sorted(keys)
-
-    result=[objdict[ii] for ii in keys]
-
-    return result
-
-
-
-    
-#-------------------------Sort annos vertically-------------------------
-def sortAnnoY(objs,verbose=True):
-    '''Sort objs vertically
-
-    Sort annotations (from Mendeley database) by (y,x)
-    coordinates of the topleft corner.
-    '''
-
-    objdict={}
-    for ii in objs:
-        objdict[-ii['rect'][3],ii['rect'][0]]=ii
-
-    keys=objdict.keys()
-    keys=sorted(keys)
-
-    result=[objdict[ii] for ii in keys]
-
-    return result
-
-
-
-
-
 #------------------------Initiate analysis objs------------------------
 def init(filename,verbose=True):
     '''Initiate analysis objs
@@ -427,11 +303,8 @@ def extractHighlights(filename,anno,verbose=True):
             interpreter.process_page(page)
             layout = device.get_result()
 
-            #--------------Sort boxes diagnoally--------------
-            objs=sortDiag(layout)
-
-            #-----------------Refine ordering-----------------
-            objs=fineTuneOrder(objs)
+            #------------Boxes in reading order------------
+            objs=readingOrder(layout)
 
             #----------------Loop through boxes----------------
             for jj,objj in enumerate(objs):
@@ -15,13 +15,15 @@ bbox of each highlight obtained from Mendeley dataset:
 Update time: 2016-02-23 18:04:10.
 Update time: 2016-06-21 16:53:02.
 Update time: 2016-06-22 16:26:16.
+Update time: 2026-10-18 15:20:05.
 '''
 
 
 
 from pdfminer.pdfparser import PDFParser
 from pdfminer.pdfdocument import PDFDocument
-from pdfminer.pdfpage import PDFPage
+from pdfminer.pdfpage import PDFPage, LITERAL_PAGE, LITERAL_PAGES
+from pdfminer.pdftypes import dict_value, list_value, int_value
 from pdfminer.pdfpage import PDFTextExtractionNotAllowed
 from pdfminer.pdfinterp import PDFResourceManager
 from pdfminer.pdfinterp import PDFPageInterpreter
@@ -30,17 +32,34 @@ from pdfminer.layout import LAParams
 from pdfminer.converter import PDFPageAggregator
 from pdfminer.layout import LTTextBox, LTTextLine, LTAnno,\
         LTTextBoxHorizontal, LTTextLineHorizontal, LTChar
-from numpy import sqrt, argsort
+from numpy import lexsort, asarray
 
 from subprocess import Popen, PIPE
-import tools
-import time
 import wordfix
+from pageindex import BoxIndex, WordIndex, overlaps
+from clipdevice import ClipAggregator
+from leaninterp import LeanInterpreter
+from readorder import readingOrder, sortY, sortAnnoY
 import os
+import re
+
+# Tolerance in y of highlight rects in the same line, see mergeRects()
+ROW_TOL=0.5
+
+try:
+    from HTMLParser import HTMLParser
+    unescape=HTMLParser().unescape
+except ImportError:
+    from html import unescape
 
 
 #------Test availability of pdftotext-------------
+# Results of the checks, so pdftotext is probed once per run, not per doc.
+_PDFTOTEXT_CHECKS={}
+
 def checkPdftotext():
+    if 'avail' in _PDFTOTEXT_CHECKS:
+        return _PDFTOTEXT_CHECKS['avail']
     try:
         pp=Popen(['pdftotext'],stdout=PIPE,stderr=PIPE)
 	re=pp.communicate()
@@ -50,11 +69,103 @@ def checkPdftotext():
             isavail=False
     except:
         isavail=False
+    _PDFTOTEXT_CHECKS['avail']=isavail
+    return isavail
+
+
+#------Test support of word boxes in pdftotext-------------
+def checkPdftotextBbox():
+    if 'bbox' in _PDFTOTEXT_CHECKS:
+        return _PDFTOTEXT_CHECKS['bbox']
+    try:
+        pp=Popen(['pdftotext','-h'],stdout=PIPE,stderr=PIPE)
+        ret=pp.communicate()
+        isavail='-bbox' in ret[0]+ret[1]
+    except:
+        isavail=False
+    _PDFTOTEXT_CHECKS['bbox']=isavail
     return isavail
 
 
 
 
+#------Read word boxes of a page range using pdftotext-------------
+_PAGE_RE=re.compile(r'<page width="([\d.]+)" height="([\d.]+)">(.*?)</page>',re.S)
+_WORD_RE=re.compile(r'<word xMin="([-\d.]+)" yMin="([-\d.]+)" xMax="([-\d.]+)" yMax="([-\d.]+)">(.*?)</word>',re.S)
+
+def getWordBoxes(filename,firstpage,lastpage,verbose=True):
+    '''Read word boxes of a page range using pdftotext
+
+    <filename>: str, path to PDF file.
+    <firstpage>, <lastpage>: int, 1-based page range to read, inclusive.
+
+    Run pdftotext once with -bbox on the page range, instead of once per
+    highlighted line.
+
+    Return <words>: dict, keys: page number, values: list of
+                    (x1, y1, x2, y2, text) of words, in pdftotext's reading
+                    order. Coordinates are converted to origin at
+                    bottom-left, as those of highlights from Mendeley.
+                    None if pdftotext fails.
+    '''
+
+    args=['pdftotext','-f',firstpage,'-l',lastpage,'-bbox','-enc','UTF-8',\
+            os.path.abspath(filename),'-']
+    args=map(str,args)
+
+    try:
+        pp=Popen(args,stdout=PIPE,stderr=PIPE)
+        out,err=pp.communicate()
+    except OSError:
+        return None
+    if pp.returncode!=0:
+        return None
+
+    out=out.decode('utf-8','replace')
+    words={}
+    for ii,(width,height,body) in enumerate(_PAGE_RE.findall(out)):
+        height=float(height)
+        wordsii=[]
+        # NOTE: pdftotext coordinate has origin at top-left.
+        for x1,y1,x2,y2,text in _WORD_RE.findall(body):
+            wordsii.append((float(x1),height-float(y2),float(x2),\
+                    height-float(y1),unescape(text)))
+        words[firstpage+ii]=wordsii
+
+    return words
+
+
+#--------Read word boxes of highlighted pages using pdftotext--------
+def getPagesWordBoxes(filename,pages,verbose=True):
+    '''Read word boxes of some pages using pdftotext
+
+    <filename>: str, path to PDF file.
+    <pages>: list of ints, 1-based page numbers.
+
+    Run getWordBoxes() once per run of consecutive pages, so pages in
+    between are not read.
+
+    Return <words>: dict, keys: page number, values: list of word boxes,
+                    see getWordBoxes(). None if pdftotext fails.
+    '''
+
+    pages=sorted(set(pages))
+    words={}
+    start=0
+    for jj in range(1,len(pages)+1):
+        if jj<len(pages) and pages[jj]==pages[jj-1]+1:
+            continue
+        wordsjj=getWordBoxes(filename,pages[start],pages[jj-1])
+        if wordsjj is None:
+            return None
+        words.update(wordsjj)
+        start=jj
+
+    return words
+
+
+
+
 
 #------Store highlighted texts with metadata------
 class Anno(object):
@@ -98,28 +209,56 @@ Tags:               %s
 
 
 #-------Locate and extract strings from a page layout obj-------
-def findStrFromBox(anno,box,verbose=True):
+def findStrFromBox(anno,box,verbose=True,index=None):
     '''Locate and extract strings from a page layout obj
 
     Extract text using pdfminer
+
+    <index>: BoxIndex obj of <box>, or None. If given, find
+             the lines and chars under each highlight with it instead of
+             scanning the box. See lib/pageindex.py.
+
+    Lines of <box> are sorted, and their gaps measured, once for all
+    highlights in <box>.
     '''
 
     texts=u''
     num=0
+    gaps=None   #line and char gaps of <box>, from measureGap()
+
+    if index is not None:
+        lines=index.lines
+    else:
+        lines=None
 
     #----------------Loop through annos----------------
     for ii,hii in enumerate(anno):
 
-        #----------Create a dummy LTTextLine obj----------
         hiibox=hii['rect']
-        dummy=LTTextLine(hiibox)
-        dummy.set_bbox(hiibox)   #Needs this step
+        if index is not None:
+            isoverlap=index.overlaps(hiibox)
+        else:
+            #----------Create a dummy LTTextLine obj----------
+            dummy=LTTextLine(hiibox)
+            dummy.set_bbox(hiibox)   #Needs this step
+            isoverlap=box.is_hoverlap(dummy) and box.is_voverlap(dummy)
     
-        if box.is_hoverlap(dummy) and box.is_voverlap(dummy):
+        if isoverlap and index is not None:
             textii=[]
             num+=1
 
-            lines=sortY(box._objs)
+            #-------Query lines and chars under highlight-------
+            for jj in index.findLines(hiibox):
+                textii.extend(index.lineText(jj,hiibox))
+            if len(lines)>0:
+                lineii=lines[-1]
+
+        elif isoverlap:
+            textii=[]
+            num+=1
+
+            if lines is None:
+                lines=sortY(box._objs)
 
             #----------------Loop through lines----------------
             for lineii in lines:
@@ -140,6 +279,7 @@ def findStrFromBox(anno,box,verbose=True):
                                     charii.is_voverlap(dummy):
                                 textii.append(charii.get_text())
 
+        if isoverlap:
             #----------------Concatenate texts----------------
             textii=u''.join(textii).strip(' ')
 
@@ -154,7 +294,9 @@ def findStrFromBox(anno,box,verbose=True):
                 joiner=u' '
 
             #---------------Jump---------------
-            linegap,chargap=measureGap(lines)
+            if gaps is None:
+                gaps=measureGap(lines)
+            linegap,chargap=gaps
             textii=textii.strip()
             if ii==0 or len(texts)==0:
                 texts+=joiner+textii
@@ -181,15 +323,33 @@ def findStrFromBox(anno,box,verbose=True):
 
 
 #-------Locate and extract strings from a page layout obj-------
-def findStrFromBox2(anno,box,filename,pheight,verbose=True):
+def findStrFromBox2(anno,box,filename,pheight,words=None,verbose=True,\
+        index=None):
     '''Locate and extract strings from a page layout obj
 
     Extract text using pdftotext
+
+    <words>: WordIndex obj or None, word boxes of the page from
+             getWordBoxes(). If given, clip the highlights from these,
+             except those starting or ending mid-word. Otherwise call
+             pdftotext on each highlighted line.
+    <index>: BoxIndex obj of <box> or None. If given, find the lines
+             under each highlight with it instead of scanning the box.
+             See lib/pageindex.py.
+
+    Lines of <box> are sorted, and their gaps measured, once for all
+    highlights in <box>.
     '''
 
 
     texts=u''
     num=0
+    gaps=None   #line and char gaps of <box>, from measureGap()
+
+    if index is not None:
+        lines=index.lines
+    else:
+        lines=sortY(box._objs)
     # pdftotext requires int coordinates, scale default dpi of
     # pdftotext (72) to 720, and multiply coordinates by 10.
     coord2str=lambda x: int(round(10.*x))  
@@ -197,40 +357,54 @@ def findStrFromBox2(anno,box,filename,pheight,verbose=True):
     #----------------Loop through annos----------------
     for ii,hii in enumerate(anno):
 
-        #----------Create a dummy LTTextLine obj----------
         hiibox=hii['rect']
-        dummy=LTTextLine(hiibox)
-        dummy.set_bbox(hiibox)   #Needs this step
+        if index is not None:
+            isoverlap=index.overlaps(hiibox)
+        else:
+            #----------Create a dummy LTTextLine obj----------
+            dummy=LTTextLine(hiibox)
+            dummy.set_bbox(hiibox)   #Needs this step
+            isoverlap=box.is_hoverlap(dummy) and box.is_voverlap(dummy)
 
-        if box.is_hoverlap(dummy) and box.is_voverlap(dummy):
+        if isoverlap:
             textii=[]
             num+=1
 
-            lines=sortY(box._objs)
+            if index is not None:
+                # Only the 1st line under the highlight is needed
+                found=index.findLines(hiibox)[:1]
+                linesii=[lines[jj] for jj in found]
+                if len(found)==0 and len(lines)>0:
+                    lineii=lines[-1]
+            else:
+                linesii=lines
 
             #----------------Loop through lines----------------
-            for lineii in lines:
+            for lineii in linesii:
                 if type(lineii)!=LTTextLine and\
                         type(lineii)!=LTTextLineHorizontal:
                     continue
-                if lineii.is_hoverlap(dummy) and\
-                        lineii.is_voverlap(dummy):
+                if overlaps(lineii.bbox,hiibox):
+
+                    if words is not None:
+                        clipped=words.clip(hiibox)
+                        if clipped is not None:
+                            textii.append(clipped)
+                            break
+                        # Highlight starts or ends mid-word, crop the line
 
-                    #------Call pdftotext and same to a temp file------
+                    #------Call pdftotext and read from stdout------
                     # NOTE: pdftotext coordinate has origin at top-left.
                     # Coordinates from Mendeley has origin at bottom-left.
                     args=['pdftotext','-f',hii['page'],'-l',hii['page'],'-r',720,\
                             '-x',coord2str(hiibox[0]),'-y',coord2str(pheight-hiibox[3]),\
                             '-W',coord2str(hiibox[2]-hiibox[0]),'-H',coord2str(hiibox[3]-hiibox[1]),\
-                            os.path.abspath(filename),'tmp.txt']
+                            '-enc','UTF-8',os.path.abspath(filename),'-']
                     args=map(str,args)
 
-                    pp=Popen(args)
-                    while pp.poll() !=0:
-                        time.sleep(0.01)
-
-                    tii=tools.readFile('tmp.txt',False)
-                    textii.append(tii)
+                    pp=Popen(args,stdout=PIPE,stderr=PIPE)
+                    tii,err=pp.communicate()
+                    textii.append(tii.decode('utf-8','replace'))
 
                     # break to avoid double sampling. Lines from lineii may
                     # overlap, and may fetch a highlight twice if not break.
@@ -250,7 +424,9 @@ def findStrFromBox2(anno,box,filename,pheight,verbose=True):
                 joiner=u' '
 
             #---------------Jump---------------
-            linegap,chargap=measureGap(lines)
+            if gaps is None:
+                gaps=measureGap(lines)
+            linegap,chargap=gaps
             textii=textii.strip()
             if ii==0 or len(texts)==0:
                 texts+=joiner+textii
@@ -277,70 +453,86 @@ def findStrFromBox2(anno,box,filename,pheight,verbose=True):
 
 
 #----------------Merge overlapping highlights in a line----------------
-def mergeLine(anno,verbose=True):
-    '''Merge overlapping highlights in a line
+def mergeRects(rects,ytol=ROW_TOL):
+    '''Group overlapping rects in a line
 
-    <anno>: list of dicts, each an Anno obj.
+    <rects>: (N,4) ndarray, [x1,y1,x2,y2] of highlights.
+    <ytol>: float, rects whose y1 and y2 differ by no more than <ytol>
+            from those of the 1st rect of a row are in the same row.
+
+    Rects are sorted by row then by x1, and the rects of each row are
+    merged in one sweep: a rect starting before the end of the current
+    group (ends included) joins the group.
+
+    Return <groups>: list of lists of ints, indices in <rects> of each
+                     group of overlapping rects, groups in the order of
+                     their 1st rect in <rects>.
     '''
 
-    def hoverlap(rect1,rect2):
-        x1=rect1[0]
-        x2=rect1[2]
-        x3=rect2[0]
-        x4=rect2[2]
-        if (x2-x3)*(x1-x3)<=0 or (x2-x4)*(x1-x4)<=0:
-            return True
-        else:
-            return False
+    rects=asarray(rects,dtype='float').reshape(-1,4)
+    if len(rects)==0:
+        return []
 
-    #----------------Get y coordinates----------------
-    ys=[(ii['rect'][1],ii['rect'][3]) for ii in anno]
-    ys_uni=list(set(ys))
+    #-------------------Assign rows-------------------
+    rows=[0]*len(rects)
+    order=lexsort((rects[:,3],rects[:,1]))
+    row=0
+    ry1,ry2=rects[order[0],1],rects[order[0],3]
+    for ii in order:
+        if abs(rects[ii,1]-ry1)>ytol or abs(rects[ii,3]-ry2)>ytol:
+            row+=1
+            ry1,ry2=rects[ii,1],rects[ii,3]
+        rows[ii]=row
+
+    #-----------Sweep each row from the left-----------
+    order=lexsort((rects[:,0],rows))
+    groups=[]
+    for ii in order:
+        if len(groups)>0 and rows[groups[-1][0]]==rows[ii] and\
+                rects[ii,0]<=x2:
+            groups[-1].append(ii)
+            x2=max(x2,rects[ii,2])
+        else:
+            groups.append([ii])
+            x2=rects[ii,2]
 
-    if len(ys)==len(ys_uni):
-        return anno
+    groups=[sorted(gii) for gii in groups]
+    groups.sort()
 
-    #-----------Find overlapping highlights-----------
-    m_list=[]
-    dup_list=[]
+    return groups
 
-    for ii,aa in enumerate(anno):
-        if ii==len(anno)-1:
-            break
 
-        r1=aa['rect']
-        idxii=[]
+def mergeLine(anno,verbose=True):
+    '''Merge overlapping highlights in a line
 
-        for jj in range(ii+1,len(anno)):
-            r2=anno[jj]['rect']
+    <anno>: list of dicts, each an Anno obj.
 
-            if r1[1]==r2[1] and r1[3]==r2[3] and\
-                    hoverlap(r1,r2):
-                idxii.append(jj)
-                dup_list.append(jj)
-                if ii not in idxii:
-                    idxii.append(ii)
-                if ii not in dup_list:
-                    dup_list.append(ii)
+    Return <new_anno>: list of dicts, <anno> with each group of overlapping
+                       highlights (see mergeRects()) replaced by a copy of
+                       its 1st highlight, with a rect covering the group
+                       and the latest cdate in the group.
+    '''
 
-        if len(idxii)>0:
-            m_list.append(idxii)
+    groups=mergeRects([ii['rect'] for ii in anno])
+    if len(groups)==len(anno):
+        return anno
 
     #----------------------Merge overlaps----------------------
     new_anno=[]
-
-    for ii,aa in enumerate(anno):
-        if ii not in dup_list:
-            new_anno.append(aa)
-
-    for ii in m_list:
-        rii=anno[ii[0]]['rect']
-        x1s=[anno[jj]['rect'][0] for jj in ii]
-        x2s=[anno[jj]['rect'][2] for jj in ii]
-
-        mrect=[min(x1s),rii[1],max(x2s),rii[3]]
-        manno=anno[ii[0]]
-        manno['rect']=mrect
+    for gii in groups:
+        if len(gii)==1:
+            new_anno.append(anno[gii[0]])
+            continue
+
+        rects=[anno[jj]['rect'] for jj in gii]
+        manno=dict(anno[gii[0]])
+        manno['rect']=[min([rjj[0] for rjj in rects]),\
+                min([rjj[1] for rjj in rects]),\
+                max([rjj[2] for rjj in rects]),\
+                max([rjj[3] for rjj in rects])]
+        cdates=[anno[jj]['cdate'] for jj in gii if anno[jj]['cdate'] is not None]
+        if len(cdates)>0:
+            manno['cdate']=max(cdates)
         new_anno.append(manno)
 
     return new_anno
@@ -424,159 +616,199 @@ def checkJump(lastbox,curbox,curline,linegap,chargap):
     return False
 
 
-#-------------------------Fine tune box order-------------------------
-def fineTuneOrder(objs,verbose=True):
-    '''Fine tune box order
-
-    For a list of box objs that share similar x coordinates
-    of the top-left corner, sort using their y (+ve upwards)
-    coordinates so that larger y goes first.
-    '''
-
-    topleft=[(ii.bbox[0],ii.bbox[3]) for ii in objs]
-    objdict={}
-    for ii in objs:
-        objdict[ii.bbox[0],ii.bbox[3]]=ii
-
-    for ii in range(len(objs)-1):
-        x0,y0=topleft[ii]
-        x1,y1=topleft[ii+1]
-
-        if abs(x0-x1)<=30 and y1-y0>1:
-            topleft[ii]=(x1,y1)
-            topleft[ii+1]=(x0,y0)
-
-    result=[]
-    for ii in topleft:
-        result.append(objdict[ii])
-
-    return result
-
-
-
-
-#---------------------Sort box elements diagnoally---------------------
-def sortDiag(layout,verbose=True):
-    '''Sort box elements diagnoally
-
-    Sort the box objs in <layout> so that they follow the
-    reading order in 2-column PDFs: from top-down, from
-    left to right column.
-
-    Sort by measuring the perpendicular distance from the
-    topleft corner of a box to the line (y=2w/h*x+h, with origin
-    at bottom-left corner of page).
-    '''
-
-    dist=lambda x,y,w,h: abs(2.*h*x/w-y+h)/sqrt((2.*h/w)**2+1)
-
-    w=layout.width
-    h=layout.height
-
-    dists=[dist(jj.bbox[0],jj.bbox[3],w,h) for jj in layout._objs]
-    idx=argsort(dists)
-
-    objs=[layout._objs[ii] for ii in idx]
-
-    return objs
-
-
-
+#------------------------Initiate analysis objs------------------------
+def init(filename,verbose=True,clip=False):
+    '''Initiate analysis objs
 
-#-------------------------Sort objs vertically-------------------------
-def sortY(objs,verbose=True):
-    '''Sort objs vertically
+    <clip>: bool, if True, use a ClipAggregator device, which only keeps
+            the chars under the rects set with its setRects(). See
+            lib/clipdevice.py.
 
-    Sort objs with similar x coordinates by y coordinates
+    The interpreter is a LeanInterpreter, which skips images, and forms
+    away from the rects set with its setRects(). See lib/leaninterp.py.
     '''
 
-    objdict={}
-    for ii in objs:
-        objdict[-ii.bbox[3],ii.bbox[0]]=ii
+    fp = open(filename, 'rb')
+    # Create a PDF parser object associated with the file object.
+    parser = PDFParser(fp)
+    # Create a PDF document object that stores the document structure.
+    # Supply the password for initialization.
+    document = PDFDocument(parser)
+    # Check if the document allows text extraction. If not, abort.
+    if not document.is_extractable:
+        raise PDFTextExtractionNotAllowed
+    # Create a PDF resource manager object that stores shared resources.
+    rsrcmgr = PDFResourceManager()
+    # Create a PDF device object.
+    device = PDFDevice(rsrcmgr)
+    # Create a PDF interpreter object.
+    interpreter = PDFPageInterpreter(rsrcmgr, device)
+    # Set parameters for analysis.
+    laparams = LAParams()
 
-    keys=objdict.keys()
-    keys=sorted(keys)
+    # Create a PDF page aggregator object.
+    if clip:
+        device = ClipAggregator(rsrcmgr, laparams=laparams)
+    else:
+        device = PDFPageAggregator(rsrcmgr, laparams=laparams)
+    interpreter = LeanInterpreter(rsrcmgr, device)
 
-    result=[objdict[ii] for ii in keys]
+    return document, interpreter, device
+    
 
-    return result
 
 
+#----------------Get selected pages of a PDF----------------
+def getPages(document,pagenos,verbose=True):
+    '''Get selected pages of a PDF
 
+    <document>: PDFDocument obj.
+    <pagenos>: list of ints, 1-based page numbers.
 
-#------------------------Sort objs horizontally------------------------
-def sortX(objs,verbose=True):
-    '''Sort objs horizontally
+    Walk the page tree and skip whole subtrees without any of <pagenos>,
+    using the /Count of each /Pages node, so pages before, between and after
+    the wanted ones are not loaded. If the page tree gives no pages, fall
+    back to reading pages in order, stopping after max(<pagenos>).
 
-    Sort objs with similar y coordinates by x coordinates
+    Return an iterator of (ii, page), <ii> being the 0-based page index,
+    <page> a PDFPage obj, in page order.
     '''
 
-    objdict={}
-    for ii in objs:
-        objdict[ii.bbox[0],-ii.bbox[3]]=ii
-
-    keys=objdict.keys()
-    keys=sorted(keys)
-
-    result=[objdict[ii] for ii in keys]
-
-    return result
+    # Wanted pages as 0-based indices
+    wanted=sorted(set([ii-1 for ii in pagenos]))
+    if len(wanted)==0:
+        return
+    last=wanted[-1]
 
+    # Index of the next page in the walk
+    pos=[0]
+    visited=set()
 
+    def hasWanted(start,count):
+        return any(start<=ii<start+count for ii in wanted)
 
-    
-#-------------------------Sort annos vertically-------------------------
-def sortAnnoY(objs,verbose=True):
-    '''Sort objs vertically
-
-    Sort annotations (from Mendeley database) by (y,x)
-    coordinates of the topleft corner.
-    '''
-
-    objdict={}
-    for ii in objs:
-        objdict[-ii['rect'][3],ii['rect'][0]]=ii
+    def search(obj,parent):
+        if isinstance(obj,int):
+            objid=obj
+            tree=dict_value(document.getobj(objid)).copy()
+        else:
+            objid=obj.objid
+            tree=dict_value(obj).copy()
+        if objid in visited:
+            return
+        visited.add(objid)
+
+        for k,v in parent.items():
+            if k in PDFPage.INHERITABLE_ATTRS and k not in tree:
+                tree[k]=v
+
+        if tree.get('Type') is LITERAL_PAGES and 'Kids' in tree:
+            for c in list_value(tree['Kids']):
+                if pos[0]>last:
+                    return
+                #----Skip subtrees without wanted pages----
+                kid=dict_value(c)
+                if kid.get('Type') is LITERAL_PAGES and 'Count' in kid:
+                    count=int_value(kid['Count'])
+                    if count>0 and not hasWanted(pos[0],count):
+                        pos[0]+=count
+                        continue
+                for x in search(c,tree):
+                    yield x
+        elif tree.get('Type') is LITERAL_PAGE:
+            if pos[0] in wanted:
+                yield pos[0],objid,tree
+            pos[0]+=1
+
+    found=False
+    if 'Pages' in document.catalog:
+        for ii,objid,tree in search(document.catalog['Pages'],document.catalog):
+            yield ii,PDFPage(document,objid,tree)
+            found=True
+    if found:
+        return
+
+    #--------------Fallback: pages in order--------------
+    for ii,page in enumerate(PDFPage.create_pages(document)):
+        if ii>last:
+            break
+        if ii in wanted:
+            yield ii,page
 
-    keys=objdict.keys()
-    keys=sorted(keys)
 
-    result=[objdict[ii] for ii in keys]
 
-    return result
 
 
+#----------------Get layouts of selected pages----------------
+def getLayouts(filename,pagenos,cache=None,filehash=None,verbose=True,\
+        rects=None,clip=False):
+    '''Get layouts of selected pages of a PDF
 
+    <filename>: str, path to PDF file.
+    <pagenos>: list of ints, 1-based page numbers.
+    <cache>: LayoutCache obj or None. If given, pages found in it are
+             loaded instead of analysed, and analysed pages are added.
+             See lib/layoutcache.py.
+    <filehash>: str or None, Mendeley file hash of the PDF, the cache key.
+    <rects>: dict or None, keys: page numbers, values: lists of
+             [x1,y1,x2,y2] highlight rects. If given, forms away from the
+             rects of a page are not interpreted (see lib/leaninterp.py).
+    <clip>: bool, if True, pages are analysed with only the chars near
+            <rects> (see lib/clipdevice.py). Such clipped layouts are not
+            added to <cache>, but full layouts found in it are still used.
 
+    The PDF is only opened if some page is not in the cache.
 
-#------------------------Initiate analysis objs------------------------
-def init(filename,verbose=True):
-    '''Initiate analysis objs
+    Return an iterator of (ii, layout), <ii> being the 0-based page index,
+    <layout> a LTPage obj, in page order.
     '''
 
-    fp = open(filename, 'rb')
-    # Create a PDF parser object associated with the file object.
-    parser = PDFParser(fp)
-    # Create a PDF document object that stores the document structure.
-    # Supply the password for initialization.
-    document = PDFDocument(parser)
-    # Check if the document allows text extraction. If not, abort.
-    if not document.is_extractable:
-        raise PDFTextExtractionNotAllowed
-    # Create a PDF resource manager object that stores shared resources.
-    rsrcmgr = PDFResourceManager()
-    # Create a PDF device object.
-    device = PDFDevice(rsrcmgr)
-    # Create a PDF interpreter object.
-    interpreter = PDFPageInterpreter(rsrcmgr, device)
-    # Set parameters for analysis.
-    laparams = LAParams()
+    pagenos=sorted(set(pagenos))
+    if cache is None or not filehash:
+        cache=None
+        missing=set(pagenos)
+    else:
+        missing=[ii for ii in pagenos if not cache.has(filehash,ii)]
+    missing=set(missing)
+
+    #------Open the PDF only if some page is not cached------
+    pdf=[]  #document, interpreter, device
+
+    def analyse(pnos):
+        if len(pdf)==0:
+            pdf.extend(init(filename,clip=clip))
+        document, interpreter, device=pdf
+        for ii,page in getPages(document,pnos):
+            if rects is not None:
+                interpreter.setRects(rects.get(ii+1,[]))
+                if clip:
+                    device.setRects(rects.get(ii+1,[]))
+            interpreter.process_page(page)
+            layout=device.get_result()
+            if cache is not None and not clip:
+                cache.put(filehash,ii+1,layout)
+            yield ii,layout
+
+    analysed=analyse(sorted(missing)) if len(missing)>0 else iter([])
+
+    for pii in pagenos:
+        if pii in missing:
+            # Pages beyond the end of the PDF are not returned
+            for ii,layout in analysed:
+                yield ii,layout
+                break
+            else:
+                return
+        else:
+            layout=cache.get(filehash,pii)
+            if layout is None:
+                # Unreadable entry, analyse the page again
+                for ii,layout in analyse([pii]):
+                    yield ii,layout
+            else:
+                yield pii-1,layout
 
-    # Create a PDF page aggregator object.
-    device = PDFPageAggregator(rsrcmgr, laparams=laparams)
-    interpreter = PDFPageInterpreter(rsrcmgr, device)
 
-    return document, interpreter, device
-    
 
 
 
@@ -595,21 +827,29 @@ def getCtime(annos,verbose=True):
 
 
 #----------------Extract highlighted texts from a PDF--------
-def extractHighlights(filename,anno,verbose=True):
+def extractHighlights(filename,anno,verbose=True,cache=None,clip=False):
     '''Extract highlighted texts from a PDF
 
+    <cache>: LayoutCache obj or None, if given, reuse page layouts
+             analysed in earlier runs. See getLayouts().
+    <clip>: bool, if True, only analyse the layout of the text under the
+            highlights, see lib/clipdevice.py.
     '''
     hlpages=anno.hlpages
     if len(hlpages)==0:
         return []
 
-    #--------------Get pdfmine instances--------------
-    document, interpreter, device=init(filename)
+    filehash=getattr(anno,'filehash',None)
 
     #----------------Loop through pages----------------
     hltexts=[]
 
-    for ii,page in enumerate(PDFPage.create_pages(document)):
+    #------Rects of merged highlights in each page------
+    rects=dict([(pp,[hii['rect'] for hii in mergeLine(anno.highlights[pp])])\
+            for pp in hlpages])
+
+    for ii,layout in getLayouts(filename,hlpages,cache,filehash,rects=rects,\
+            clip=clip):
 
         #------------Get highlights in page------------
         if len(hlpages)>0 and ii+1 in hlpages:
@@ -624,22 +864,23 @@ def extractHighlights(filename,anno,verbose=True):
             #-----------Sort annotations vertically-----------
             annoii=sortAnnoY(annoii)
 
-            interpreter.process_page(page)
-            layout = device.get_result()
 
-            #--------------Sort boxes diagnoally--------------
-            objs=sortDiag(layout)
-
-            #-----------------Refine ordering-----------------
-            objs=fineTuneOrder(objs)
+            #------------Boxes in reading order------------
+            objs=readingOrder(layout)
 
             #----------------Loop through boxes----------------
+            rects=[hii['rect'] for hii in annoii]
             for jj,objj in enumerate(objs):
 
                 if type(objj)!=LTTextBox and\
                         type(objj)!=LTTextBoxHorizontal:
                     continue
-                textjj,numjj=findStrFromBox(annoii,objj)
+
+                # Only index boxes under some highlight
+                if not any(overlaps(objj.bbox,rii) for rii in rects):
+                    continue
+                index=BoxIndex(objj,sortY(objj._objs))
+                textjj,numjj=findStrFromBox(annoii,objj,index=index)
 
                 if numjj>0:
                     #--------------Attach text with meta--------------
@@ -666,23 +907,40 @@ def extractHighlights(filename,anno,verbose=True):
 
 
 #----------------Extract highlighted texts from a PDF--------
-def extractHighlights2(filename,anno,verbose=True):
+def extractHighlights2(filename,anno,verbose=True,cache=None,clip=False):
     '''Extract highlighted texts from a PDF
 
     Extract texts from PDF using pdftotext
+
+    <cache>: LayoutCache obj or None, if given, reuse page layouts
+             analysed in earlier runs. See getLayouts().
+    <clip>: bool, if True, only analyse the layout of the text under the
+            highlights, see lib/clipdevice.py.
     '''
 
     hlpages=anno.hlpages
     if len(hlpages)==0:
         return []
 
-    #--------------Get pdfmine instances--------------
-    document, interpreter, device=init(filename)
+    filehash=getattr(anno,'filehash',None)
+
+    #--------Get word boxes of all highlighted pages--------
+    # One pdftotext call per run of consecutive highlighted pages. If
+    # -bbox is not supported, fall back to one call per highlighted line.
+    if checkPdftotextBbox():
+        words=getPagesWordBoxes(filename,hlpages)
+    else:
+        words=None
 
     #----------------Loop through pages----------------
     hltexts=[]
 
-    for ii,page in enumerate(PDFPage.create_pages(document)):
+    #------Rects of merged highlights in each page------
+    rects=dict([(pp,[hii['rect'] for hii in mergeLine(anno.highlights[pp])])\
+            for pp in hlpages])
+
+    for ii,layout in getLayouts(filename,hlpages,cache,filehash,rects=rects,\
+            clip=clip):
 
         #------------Get highlights in page------------
         if len(hlpages)>0 and ii+1 in hlpages:
@@ -697,23 +955,30 @@ def extractHighlights2(filename,anno,verbose=True):
             #-----------Sort annotations vertically-----------
             annoii=sortAnnoY(annoii)
 
-            interpreter.process_page(page)
-            layout = device.get_result()
             page_height=layout.height
 
-            #--------------Sort boxes diagnoally--------------
-            objs=sortDiag(layout)
+            if words is not None:
+                wordsii=WordIndex(words.get(ii+1,[]))
+            else:
+                wordsii=None
 
-            #-----------------Refine ordering-----------------
-            objs=fineTuneOrder(objs)
+            #------------Boxes in reading order------------
+            objs=readingOrder(layout)
 
             #----------------Loop through boxes----------------
+            rects=[hii['rect'] for hii in annoii]
             for jj,objj in enumerate(objs):
 
                 if type(objj)!=LTTextBox and\
                         type(objj)!=LTTextBoxHorizontal:
                     continue
-                textjj,numjj=findStrFromBox2(annoii,objj,filename,page_height)
+
+                # Only index boxes under some highlight
+                if not any(overlaps(objj.bbox,rii) for rii in rects):
+                    continue
+                index=BoxIndex(objj,sortY(objj._objs))
+                textjj,numjj=findStrFromBox2(annoii,objj,filename,page_height,\
+                        wordsii,index=index)
 
                 if numjj>0:
                     #--------------Attach text with meta--------------
@@ -26,28 +26,40 @@ def groupByTags(annodict,verbose=True):
 
     #----------------Loop through files----------------
     for idii,annoii in annodict.items():
+        addDocTags(tags,annoii)
 
-        hlii=annoii.highlights
-        ntii=annoii.notes
+    return tags
 
-        if len(hlii)==0 and len(ntii)==0:
-            continue
 
-        citeii=annoii.meta['citationkey']
-        tagsii=annoii.meta['tags']
-        tagsii=['@'+kk for kk in tagsii]
+#----------------------------------------
+def addDocTags(tags,annoii):
+    '''Add the highlights and/or notes of a doc to groups by tags
 
-        citedict={'highlights': hlii,\
-                  'notes': ntii}
+    <tags>: dict, groups by tags, as from groupByTags(). Updated in place.
+    <annoii>: FileAnno obj, with extracted highlights and notes.
+    '''
 
-        #----------------Loop through tags----------------
-        for tagsjj in tagsii:
-            if tagsjj in tags:
-                tags[tagsjj][citeii]=citedict
-            else:
-                tags[tagsjj]={citeii:citedict}
+    hlii=annoii.highlights
+    ntii=annoii.notes
 
-    return tags
+    if len(hlii)==0 and len(ntii)==0:
+        return
+
+    citeii=annoii.meta['citationkey']
+    tagsii=annoii.meta['tags']
+    tagsii=['@'+kk for kk in tagsii]
+
+    citedict={'highlights': hlii,\
+              'notes': ntii}
+
+    #----------------Loop through tags----------------
+    for tagsjj in tagsii:
+        if tagsjj in tags:
+            tags[tagsjj][citeii]=citedict
+        else:
+            tags[tagsjj]={citeii:citedict}
+
+    return
 
 
 
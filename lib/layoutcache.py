@@ -0,0 +1,186 @@
+'''On-disk cache of analysed PDF page layouts.
+
+pdfminer layout analysis is the slowest step of highlight extraction.
+Analysed pages are stored in a cache directory, keyed by the Mendeley
+file hash (Files.hash), the page number and EXTRACTOR_VERSION, so that
+re-exports of unchanged PDFs skip the analysis.
+
+Only what the extractor reads is kept: the page size, the bbox of each
+top-level obj, the lines and chars (text and bbox) of text boxes, and
+the reading order of the objs (see lib/readorder.py).
+These are pickled, compressed, and rebuilt into pdfminer layout objs on
+loading.
+
+
+# Copyright 2016 Guang-zhi XU
+#
+# This file is distributed under the terms of the
+# GPLv3 licence. See the LICENSE file for details.
+# You may use, distribute and modify this code under the
+# terms of the GPLv3 license.
+
+Update time: 2026-10-18 14:20:36.
+'''
+
+import os
+import zlib
+import tempfile
+try:
+    import cPickle as pickle
+except ImportError:
+    import pickle
+
+from pdfminer.layout import LTPage, LTComponent, LTTextBox,\
+        LTTextBoxHorizontal, LTTextLineHorizontal, LTChar, LTAnno
+
+from readorder import pageOrder
+
+
+# Change this when the layout analysis (LAParams, sorting) or the stored
+# form changes, so that old entries are no longer used.
+EXTRACTOR_VERSION='2'
+
+
+
+#-------------Convert a page layout to plain tuples-------------
+def dumpLayout(layout):
+    '''Convert a page layout to plain tuples
+
+    <layout>: LTPage obj, result of layout analysis.
+
+    The reading order of <layout> is computed if not yet done, and kept
+    as <layout.order>.
+
+    Return <data>: tuple, (width, height, objs, order). Each element of
+                   <objs> is (bbox, lines) for text boxes, or (bbox, None)
+                   for other objs. Each line is (bbox, chars), each char
+                   (text, x0, y0, x1, y1), or a str for LTAnno. <order>
+                   is the reading order, indices in <objs>.
+    '''
+
+    objs=[]
+    for objii in layout._objs:
+        if type(objii) not in (LTTextBox,LTTextBoxHorizontal):
+            objs.append((objii.bbox,None))
+            continue
+        lines=[]
+        for linejj in objii._objs:
+            chars=[]
+            for charkk in getattr(linejj,'_objs',[]):
+                if type(charkk)==LTChar:
+                    chars.append((charkk.get_text(),)+tuple(charkk.bbox))
+                elif type(charkk)==LTAnno:
+                    chars.append(charkk.get_text())
+            lines.append((linejj.bbox,chars))
+        objs.append((objii.bbox,lines))
+
+    if getattr(layout,'order',None) is None:
+        layout.order=pageOrder(layout)
+
+    return (layout.width,layout.height,objs,layout.order)
+
+
+#-------------Rebuild a page layout from plain tuples-------------
+def loadLayout(data,pageid=None):
+    '''Rebuild a page layout from plain tuples
+
+    <data>: tuple, see dumpLayout().
+
+    Return <layout>: LTPage obj, with LTTextBoxHorizontal,
+                     LTTextLineHorizontal, LTChar and LTAnno objs for the
+                     text, and LTComponent objs in place of the others.
+                     The stored reading order is set as <layout.order>.
+    '''
+
+    width,height,objs,order=data
+    layout=LTPage(pageid,(0,0,width,height))
+    layout.order=list(order)
+
+    for bbox,lines in objs:
+        if lines is None:
+            layout._objs.append(LTComponent(bbox))
+            continue
+        box=LTTextBoxHorizontal()
+        box.set_bbox(bbox)
+        for linebbox,chars in lines:
+            line=LTTextLineHorizontal(0.1)
+            line.set_bbox(linebbox)
+            for charkk in chars:
+                if isinstance(charkk,tuple):
+                    # Skip LTChar.__init__(), it needs the font
+                    char=LTChar.__new__(LTChar)
+                    LTComponent.__init__(char,charkk[1:])
+                    char._text=charkk[0]
+                    line._objs.append(char)
+                else:
+                    line._objs.append(LTAnno(charkk))
+            box._objs.append(line)
+        layout._objs.append(box)
+
+    return layout
+
+
+
+
+class LayoutCache(object):
+
+    def __init__(self,cachedir):
+        '''On-disk cache of analysed page layouts.
+
+        <cachedir>: str, folder to store the cached pages, created if
+                    not existing.
+
+        Each page is a file <cachedir>/<hash[:2]>/<hash>-<page>-v<version>.
+        Writes go to a temp file first and are then renamed, so workers
+        sharing a cache never read a partial entry.
+        '''
+        self.cachedir=os.path.abspath(os.path.expanduser(cachedir))
+        if not os.path.isdir(self.cachedir):
+            os.makedirs(self.cachedir)
+
+    def _path(self,filehash,page):
+        return os.path.join(self.cachedir,filehash[:2],\
+                '%s-%d-v%s' %(filehash,page,EXTRACTOR_VERSION))
+
+    def get(self,filehash,page):
+        '''Get the layout of a page, None if not in cache or unreadable
+        '''
+        if not filehash:
+            return None
+        try:
+            with open(self._path(filehash,page),'rb') as fin:
+                data=pickle.loads(zlib.decompress(fin.read()))
+            return loadLayout(data,page)
+        except Exception:
+            return None
+
+    def has(self,filehash,page):
+        return bool(filehash) and os.path.exists(self._path(filehash,page))
+
+    def put(self,filehash,page,layout):
+        '''Store the layout of a page
+
+        Failures to write are ignored, the page is then analysed again
+        next time.
+        '''
+        if not filehash:
+            return
+        path=self._path(filehash,page)
+        folder=os.path.dirname(path)
+        try:
+            if not os.path.isdir(folder):
+                os.makedirs(folder)
+        except OSError:
+            # Created by another worker
+            pass
+        try:
+            fd,tmppath=tempfile.mkstemp(dir=folder)
+            with os.fdopen(fd,'wb') as fout:
+                data=pickle.dumps(dumpLayout(layout),pickle.HIGHEST_PROTOCOL)
+                fout.write(zlib.compress(data,1))
+            os.rename(tmppath,path)
+        except Exception:
+            try:
+                os.remove(tmppath)
+            except Exception:
+                pass
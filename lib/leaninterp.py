@@ -0,0 +1,116 @@
+'''pdfminer interpreter skipping images and forms away from highlights.
+
+PDFPageInterpreter interprets every operator of a page, including image
+XObjects, inline images, and the content streams of form XObjects, which
+in figure-heavy or scanned pages can hold most of the page's operators.
+
+Highlight extraction only reads the text boxes of a page, and text in
+figures is never grouped into text boxes (LAParams.all_texts is off).
+LeanInterpreter so:
+
+- passes no image to the device, for image XObjects and inline images,
+- skips the content stream of form XObjects whose bbox does not overlap
+  any highlight rect of the page, set with setRects().
+
+The figure of a skipped image or form is still opened and closed on the
+device, so the page keeps an (empty) LTFigure with the same bbox, and the
+reading order of the page is unchanged.
+
+
+# Copyright 2016 Guang-zhi XU
+#
+# This file is distributed under the terms of the
+# GPLv3 licence. See the LICENSE file for details.
+# You may use, distribute and modify this code under the
+# terms of the GPLv3 license.
+
+Update time: 2026-10-18 18:05:37.
+'''
+
+from pdfminer.pdfinterp import PDFPageInterpreter, LITERAL_FORM, LITERAL_IMAGE
+from pdfminer.pdftypes import list_value, stream_value
+from pdfminer.psparser import literal_name
+from pdfminer.utils import MATRIX_IDENTITY, mult_matrix, apply_matrix_pt,\
+        get_bound
+
+from pageindex import overlaps
+
+
+
+def figureBbox(bbox,matrix):
+    '''Bbox of a figure in page coordinates, as computed by LTFigure
+
+    <bbox>: list, BBox of the form XObject.
+    <matrix>: tuple, matrix from form to page space.
+    '''
+    x,y,w,h=bbox
+    return get_bound(apply_matrix_pt(matrix,(p,q))\
+            for (p,q) in ((x,y),(x+w,y),(x,y+h),(x+w,y+h)))
+
+
+
+
+class LeanInterpreter(PDFPageInterpreter):
+
+    def __init__(self,rsrcmgr,device):
+        '''Page interpreter skipping images and forms away from highlights.
+
+        <rsrcmgr>: PDFResourceManager obj.
+        <device>: PDFDevice obj.
+
+        Set the rects of a page with setRects() before processing the
+        page. With no rects set, no form is skipped.
+        '''
+        PDFPageInterpreter.__init__(self,rsrcmgr,device)
+        self.rects=None
+
+
+    def dup(self):
+        # Forms are interpreted by a copy, which needs the rects too
+        interpreter=PDFPageInterpreter.dup(self)
+        interpreter.rects=self.rects
+        return interpreter
+
+
+    def setRects(self,rects):
+        '''Set the rects of the next page
+
+        <rects>: list, [x1,y1,x2,y2] of highlights, or None to interpret
+                 all forms.
+        '''
+        self.rects=rects
+
+
+    def do_EI(self,obj):
+        if 'W' in obj and 'H' in obj:
+            iobjid=str(id(obj))
+            self.device.begin_figure(iobjid,(0,0,1,1),MATRIX_IDENTITY)
+            self.device.end_figure(iobjid)
+        return
+
+
+    def do_Do(self,xobjid):
+        try:
+            xobj=stream_value(self.xobjmap[literal_name(xobjid)])
+        except KeyError:
+            return PDFPageInterpreter.do_Do(self,xobjid)
+
+        subtype=xobj.get('Subtype')
+        if subtype is LITERAL_IMAGE and 'Width' in xobj and 'Height' in xobj:
+            name=literal_name(xobjid)
+            self.device.begin_figure(name,(0,0,1,1),MATRIX_IDENTITY)
+            self.device.end_figure(name)
+            return
+
+        if subtype is LITERAL_FORM and 'BBox' in xobj and\
+                self.rects is not None:
+            bbox=list_value(xobj['BBox'])
+            matrix=list_value(xobj.get('Matrix',MATRIX_IDENTITY))
+            figbox=figureBbox(bbox,mult_matrix(matrix,self.ctm))
+            if not any(overlaps(figbox,rii) for rii in self.rects):
+                name=literal_name(xobjid)
+                self.device.begin_figure(name,bbox,matrix)
+                self.device.end_figure(name)
+                return
+
+        return PDFPageInterpreter.do_Do(self,xobjid)
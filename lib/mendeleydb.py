@@ -0,0 +1,753 @@
+'''Access to the Mendeley sqlite database.
+
+MendeleyDB holds the connection, probes the schema once when connecting,
+and runs every query from a fixed set of parameterised statements, so
+that sqlite can reuse the compiled statements across calls.
+
+Lookup tables (meta-data, file paths, folder tree) are read once per
+connection, and later lookups are served from dicts instead of
+re-running joins over the whole library.
+
+
+# Copyright 2016 Guang-zhi XU
+#
+# This file is distributed under the terms of the
+# GPLv3 licence. See the LICENSE file for details.
+# You may use, distribute and modify this code under the
+# terms of the GPLv3 license.
+
+Update time: 2026-10-18 11:02:15.
+'''
+
+import os
+import sys
+import sqlite3
+from collections import namedtuple, defaultdict
+
+if sys.version_info[0]>=3:
+    #---------------------Python3---------------------
+    from urllib.parse import unquote
+    from urllib.parse import urlparse
+    from urllib.request import pathname2url
+    imap=map
+else:
+    #--------------------Python2.7--------------------
+    from urllib import unquote
+    from urllib import pathname2url
+    from urlparse import urlparse
+    from itertools import imap
+
+
+#-----------Settings of the read-only connection mode-----------
+MMAP_SIZE=1024**3        # bytes of the database file to memory-map
+CACHE_SIZE=256*1024      # page cache size, in KiB
+BUSY_TIMEOUT=60.         # seconds to wait for a lock before giving up
+
+
+#----------Fields of the meta-data dict of a document----------
+META_FIELDS=['docid','citationkey','title','issue','pages',\
+        'publication','volume','year','doi','abstract',\
+        'arxivId','chapter','city','country','edition','institution',\
+        'isbn','issn','month','day','publisher','series','type',\
+        'read','favourite','tags','firstnames','lastname','keywords']
+
+# Fields read directly from the Documents table, in query order
+DOC_FIELDS=META_FIELDS[:25]
+
+
+#----------------Rows yielded by the iterators----------------
+HighlightRow=namedtuple('HighlightRow',\
+        'url filehash page x1 y1 x2 y2 ctime docid folderid folder color')
+NoteRow=namedtuple('NoteRow',\
+        'url page x y author note mtime docid folderid folder')
+DocNoteRow=namedtuple('DocNoteRow',\
+        'text docid basenote hash title folderid folder')
+
+
+#------------------------SQL statements------------------------
+# Columns and joins of the annotation queries. {color} is filled in
+# after probing the schema, {folder} selects the folder columns and
+# joins, or NULLs if not filtering by folder.
+_HIGHLIGHTS=\
+'''SELECT Files.localUrl, Files.hash, FileHighlightRects.page,
+                FileHighlightRects.x1, FileHighlightRects.y1,
+                FileHighlightRects.x2, FileHighlightRects.y2,
+                FileHighlights.createdTime,
+                FileHighlights.documentId,
+                {folder},
+                {color}
+        FROM Files
+        LEFT JOIN FileHighlights
+            ON FileHighlights.fileHash=Files.hash
+        LEFT JOIN FileHighlightRects
+            ON FileHighlightRects.highlightId=FileHighlights.id
+        {folderjoin}
+        WHERE (FileHighlightRects.page IS NOT NULL)
+'''
+
+_NOTES=\
+'''SELECT Files.localUrl, FileNotes.page,
+                FileNotes.x, FileNotes.y,
+                FileNotes.author, FileNotes.note,
+                FileNotes.modifiedTime,
+                FileNotes.documentId,
+                {folder}
+        FROM Files
+        LEFT JOIN FileNotes
+            ON FileNotes.fileHash=Files.hash
+        {folderjoin}
+        WHERE (FileNotes.page IS NOT NULL)
+'''
+
+_DOCNOTES=\
+'''SELECT DocumentNotes.text,
+          DocumentNotes.documentId,
+          DocumentNotes.baseNote,
+          DocumentFiles.hash,
+          Documents.title,
+          {folder}
+        FROM DocumentNotes
+        {folderjoin}
+        LEFT JOIN DocumentFiles
+            ON DocumentFiles.documentId=DocumentNotes.documentId
+        LEFT JOIN Documents
+            ON Documents.id=DocumentNotes.documentId
+        WHERE (DocumentNotes.documentId IS NOT NULL)
+'''
+
+_FOLDER_COLUMNS='DocumentFolders.folderid, Folders.name'
+_FOLDER_JOIN=\
+'''LEFT JOIN DocumentFolders
+            ON DocumentFolders.documentId={docid}
+        LEFT JOIN Folders
+            ON Folders.id=DocumentFolders.folderid'''
+
+_SQL={
+    'documents':
+    '''SELECT Documents.id,
+              Documents.citationkey,
+              Documents.title,
+              Documents.issue,
+              Documents.pages,
+              Documents.publication,
+              Documents.volume,
+              Documents.year,
+              Documents.doi,
+              Documents.abstract,
+              Documents.arxivId,
+              Documents.chapter,
+              Documents.city,
+              Documents.country,
+              Documents.edition,
+              Documents.institution,
+              Documents.isbn,
+              Documents.issn,
+              Documents.month,
+              Documents.day,
+              Documents.publisher,
+              Documents.series,
+              Documents.type,
+              Documents.read,
+              Documents.favourite
+       FROM Documents
+    ''',
+
+    # Sorted, so exported tags and keywords keep the same order across runs
+    'tags': 'SELECT documentId, tag FROM DocumentTags ORDER BY documentId, tag',
+
+    'contributors':
+    'SELECT documentId, firstNames, lastName FROM DocumentContributors',
+
+    'keywords':
+    'SELECT documentId, keyword FROM DocumentKeywords ORDER BY documentId, keyword',
+
+    'files':
+    '''SELECT Documents.id,
+              Files.localUrl
+       FROM Files
+       JOIN DocumentFiles
+           ON DocumentFiles.hash=Files.hash
+       JOIN Documents
+           ON Documents.id=DocumentFiles.documentId
+    ''',
+
+    'folders': 'SELECT Folders.id, Folders.name, Folders.parentID FROM Folders',
+
+    'folder_counts':
+    '''SELECT DocumentFolders.folderId,
+              COUNT(DISTINCT Documents.id)
+       FROM Documents
+       JOIN DocumentFolders
+           ON Documents.id=DocumentFolders.documentId
+       GROUP BY DocumentFolders.folderId
+    ''',
+
+    'all_docs': 'SELECT Documents.id FROM Documents',
+
+    'folder_docs':
+    '''SELECT Documents.id
+       FROM Documents
+       JOIN DocumentFolders
+           ON Documents.id=DocumentFolders.documentId
+       WHERE (DocumentFolders.folderid=?)
+    ''',
+
+    'canonical_docs':
+    '''SELECT Documents.id
+       FROM Documents
+       LEFT JOIN DocumentFolders
+           ON DocumentFolders.documentId=Documents.id
+       WHERE (DocumentFolders.folderId IS NULL)
+    ''',
+    }
+
+# Filters appended to the annotation queries
+_FOLDER_FILTER=' AND\n(Folders.id=?)'
+_DOCS_FILTER=' AND\n(%s IN (SELECT id FROM temp.FilterDocs))'
+
+
+
+def converturl2abspath(url):
+    '''Convert a url string to an absolute path
+    This is necessary for filenames with unicode strings.
+    '''
+
+    #--------------------For linux--------------------
+    path = unquote(str(urlparse(url).path)).decode("utf8")
+    path=os.path.abspath(path)
+
+    if os.path.exists(path):
+        return path
+    else:
+        #-------------------For windowes-------------------
+        if url[5:8]==u'///':
+            url=u'file://'+url[8:]
+            path=urlparse(url)
+            path=os.path.join(path.netloc,path.path)
+            path=unquote(str(path)).decode('utf8')
+            path=os.path.abspath(path)
+            return path
+
+
+
+#-------Open the database read-only, without taking locks-------
+def connectReadOnly(dbfin):
+    '''Open the database read-only, without taking locks
+
+    <dbfin>: str, path to the Mendeley sqlite database file.
+
+    The database is opened with the URI "file:<dbfin>?mode=ro&immutable=1",
+    so sqlite never writes to it nor takes any lock on it, and neither
+    blocks nor is blocked by a running Mendeley Desktop. Pages are read
+    through a memory map of up to MMAP_SIZE bytes and a page cache of
+    CACHE_SIZE KiB.
+
+    NOTE: in this mode sqlite trusts the file not to change while it is
+    open. Edits Mendeley saves during the export may be missed, or make
+    the export fail.
+
+    If the sqlite library can't open URI filenames, fall back to a normal
+    connection, which waits up to BUSY_TIMEOUT seconds for locks held by
+    Mendeley.
+    '''
+
+    abspath=os.path.abspath(dbfin)
+    uri='file:%s?mode=ro&immutable=1' %pathname2url(abspath)
+    samefile=lambda x: os.path.normcase(os.path.realpath(x))==\
+            os.path.normcase(os.path.realpath(abspath))
+
+    conn=None
+    try:
+        if sys.version_info[0]>=3:
+            conn=sqlite3.connect(uri,timeout=BUSY_TIMEOUT,uri=True)
+        else:
+            # URIs are honoured if sqlite is built with URI support
+            conn=sqlite3.connect(uri,timeout=BUSY_TIMEOUT)
+
+        # Without URI support the name is taken as a (non-existing) path
+        files=[r[2] for r in conn.execute('PRAGMA database_list') if r[1]=='main']
+        if len(files)==0 or not samefile(files[0]):
+            raise sqlite3.OperationalError('URI filenames not supported')
+    except sqlite3.Error:
+        if conn is not None:
+            conn.close()
+        conn=sqlite3.connect(abspath,timeout=BUSY_TIMEOUT)
+
+    conn.execute('PRAGMA mmap_size=%d' %MMAP_SIZE)
+    conn.execute('PRAGMA cache_size=%d' %(-CACHE_SIZE))
+
+    return conn
+
+
+
+class MendeleyDB(object):
+
+    def __init__(self,dbfin,readonly=False):
+        '''Connection to the Mendeley sqlite database.
+
+        <dbfin>: str, path to the Mendeley sqlite database file.
+        <readonly>: bool, if True, open the database read-only without
+                    taking locks. See connectReadOnly().
+
+        The schema is probed once here: whether the tables look like a
+        Mendeley database, and whether highlights have a color column
+        (added in Mendeley 1.16.1). The annotation queries are then
+        fixed for the life of the connection, and values are passed
+        as bound parameters.
+        '''
+
+        self.dbfin=dbfin
+        self.readonly=readonly
+        if readonly:
+            self.conn=connectReadOnly(dbfin)
+        else:
+            self.conn=sqlite3.connect(dbfin)
+
+        self._metastore=None
+        self._pathresolver=None
+        self._foldertree=None
+
+        #-------------------Probe schema-------------------
+        tables=[r[0] for r in self.conn.execute(\
+                "SELECT name FROM sqlite_master WHERE type='table'")]
+        if 'Documents' not in tables or 'FileHighlights' not in tables:
+            self.conn.close()
+            raise Exception("No Mendeley tables found in %s" %dbfin)
+
+        columns=[r[1] for r in self.conn.execute(\
+                'PRAGMA table_info(FileHighlights)')]
+        self.hascolor='color' in columns
+
+        #------------Fix the annotation queries------------
+        color='FileHighlights.color' if self.hascolor else 'NULL'
+        self._sql=dict(_SQL)
+        for name,query,docid in [\
+                ('highlights',_HIGHLIGHTS,'FileHighlights.documentId'),\
+                ('notes',_NOTES,'FileNotes.documentId'),\
+                ('docnotes',_DOCNOTES,'DocumentNotes.documentId')]:
+
+            # Filter by folder
+            folderjoin=_FOLDER_JOIN.format(docid=docid)
+            self._sql[name+'_folder']=query.format(color=color,\
+                    folder=_FOLDER_COLUMNS,folderjoin=folderjoin)+_FOLDER_FILTER
+            # Filter by docids, folders not needed
+            self._sql[name+'_docs']=query.format(color=color,\
+                    folder='NULL, NULL',folderjoin='')+_DOCS_FILTER %docid
+            # No filtering
+            self._sql[name]=query.format(color=color,\
+                    folder=_FOLDER_COLUMNS,folderjoin=folderjoin)
+
+
+    def close(self):
+        self.conn.close()
+        self._metastore=None
+        self._pathresolver=None
+        self._foldertree=None
+
+
+    def query(self,name,params=()):
+        '''Run one of the prepared statements
+
+        <name>: str, key of the statement.
+        <params>: tuple, values bound to the "?" in the statement.
+
+        Return a cursor over the result rows.
+        '''
+        return self.conn.execute(self._sql[name],params)
+
+
+    def _setDocFilter(self,docids):
+        '''Load <docids> into the temp table used to filter by docid
+        '''
+        conn=self.conn
+        conn.execute('CREATE TEMP TABLE IF NOT EXISTS FilterDocs (id INTEGER PRIMARY KEY)')
+        conn.execute('DELETE FROM temp.FilterDocs')
+        conn.executemany('INSERT OR IGNORE INTO temp.FilterDocs (id) VALUES (?)',\
+                [(ii,) for ii in docids])
+        conn.commit()
+
+
+    def _iterAnnos(self,name,rowtype,folderid,docids):
+        if docids is not None:
+            self._setDocFilter(docids)
+            ret=self.query(name+'_docs')
+        elif folderid is not None:
+            ret=self.query(name+'_folder',(folderid,))
+        else:
+            ret=self.query(name)
+        return imap(rowtype._make,ret)
+
+
+    #--------------------Annotation iterators--------------------
+    def iterHighlights(self,folderid=None,docids=None):
+        '''Iterate through highlight rects
+
+        <folderid>: int, if not None, select highlights in docs of a folder.
+        <docids>: list of ints, if not None, select highlights in these
+                  docs. Folder columns are None. Overrides <folderid>.
+
+        Return an iterator of HighlightRow. <color> is None if the database
+        has no highlight colors.
+        '''
+        return self._iterAnnos('highlights',HighlightRow,folderid,docids)
+
+
+    def iterNotes(self,folderid=None,docids=None):
+        '''Iterate through sticky notes
+
+        See iterHighlights(). Return an iterator of NoteRow.
+        '''
+        return self._iterAnnos('notes',NoteRow,folderid,docids)
+
+
+    def iterDocNotes(self,folderid=None,docids=None):
+        '''Iterate through side-bar notes
+
+        See iterHighlights(). Return an iterator of DocNoteRow.
+        '''
+        return self._iterAnnos('docnotes',DocNoteRow,folderid,docids)
+
+
+    def loadAnnosByFolder(self,ishighlight=True,isnote=True):
+        '''Read annotations of the whole library, partitioned by folder
+
+        <ishighlight>: bool, read highlights.
+        <isnote>: bool, read sticky notes and side-bar notes.
+
+        Each annotation table is scanned once, instead of once per folder.
+
+        Return <parts>: dict, keys: folderid, None for docs not in any
+                        folder (the canonical docs). values: dict with keys
+                        'highlights', 'notes' and 'docnotes', each a list of
+                        rows as from iterHighlights(), iterNotes() and
+                        iterDocNotes(). Folders without annotations give
+                        empty lists.
+        '''
+
+        parts=defaultdict(lambda: {'highlights': [], 'notes': [], 'docnotes': []})
+
+        iters=[]
+        if ishighlight:
+            iters.append(('highlights',self.iterHighlights()))
+        if isnote:
+            iters.append(('notes',self.iterNotes()))
+            iters.append(('docnotes',self.iterDocNotes()))
+
+        for kind,rows in iters:
+            for r in rows:
+                parts[r.folderid][kind].append(r)
+
+        return parts
+
+
+    def iterRows(self,name,params=(),arraysize=None):
+        '''Stream the rows of a prepared statement
+
+        <name>: str, key of the statement.
+        <params>: tuple, values bound to the "?" in the statement.
+        <arraysize>: int or None, if given, read rows in batches of this
+                     size with fetchmany(), else step the cursor one row
+                     at a time.
+        '''
+        ret=self.query(name,params)
+        if not arraysize:
+            for r in ret:
+                yield r
+            return
+
+        ret.arraysize=arraysize
+        while True:
+            rows=ret.fetchmany()
+            if not rows:
+                break
+            for r in rows:
+                yield r
+
+
+    def docIds(self,name,params=(),arraysize=None):
+        '''Get the unique doc ids returned by a prepared statement
+
+        <name>: str, key of a statement selecting doc ids in the 1st column.
+        <params>: tuple, values bound to the "?" in the statement.
+        <arraysize>: int or None, see iterRows().
+
+        Return <docids>: list of ints, in order of first appearance. Rows
+                         are consumed as they come and only the ids are
+                         kept.
+        '''
+        seen=set()
+        docids=[]
+        for r in self.iterRows(name,params,arraysize):
+            docid=r[0]
+            if docid not in seen:
+                seen.add(docid)
+                docids.append(docid)
+        return docids
+
+
+    def iterFolders(self):
+        '''Iterate through (id, name, parentID) of all folders
+        '''
+        return self.query('folders')
+
+
+    def iterMeta(self,docids):
+        '''Iterate through (docid, meta-data dict) of docs
+        '''
+        store=self.getMetaStore()
+        for ii in docids:
+            yield ii,store.get(ii)
+
+
+    #-----------------------Lookups-----------------------
+    def getMetaStore(self):
+        if self._metastore is None:
+            self._metastore=MetaStore(self)
+        return self._metastore
+
+    def getPathResolver(self):
+        if self._pathresolver is None:
+            self._pathresolver=PathResolver(self)
+        return self._pathresolver
+
+    def getFolderTree(self):
+        if self._foldertree is None:
+            self._foldertree=FolderTree(self)
+        return self._foldertree
+
+    def getMeta(self,docid):
+        '''Get meta-data dict of a doc, see MetaStore.get()
+        '''
+        return self.getMetaStore().get(docid)
+
+    def getPath(self,docid):
+        '''Get file path of a doc, see PathResolver.get()
+        '''
+        return self.getPathResolver().get(docid)
+
+    def pathsFor(self,docids):
+        '''Get file paths of docs, see PathResolver.pathsFor()
+        '''
+        return self.getPathResolver().pathsFor(docids)
+
+    def urlToPath(self,url):
+        '''Convert a localUrl to an absolute path, see PathResolver.urlToPath()
+        '''
+        return self.getPathResolver().urlToPath(url)
+
+
+
+def _squeeze(values):
+    '''Collapse a list of values the way meta-data fields are stored
+
+    Return None if <values> is empty, the single value if it has one
+    element, otherwise a copy of the list.
+    '''
+    if not values:
+        return None
+    if len(values)==1:
+        return values[0]
+    return list(values)
+
+
+
+class MetaStore(object):
+
+    def __init__(self,db):
+        '''Meta-data of all documents in the library.
+
+        <db>: MendeleyDB obj.
+
+        Documents, tags, contributors and keywords are each read with a
+        single query and grouped by documentId, so the cost of building
+        the store is linear in the library size, and each lookup is a
+        dict access.
+        '''
+
+        self.docs={}
+        self.tags={}
+        self.firstnames={}
+        self.lastnames={}
+        self.keywords={}
+
+        for r in db.query('documents'):
+            self.docs[r[0]]=r
+
+        #--------------Tags, duplicates removed--------------
+        for docid,tag in db.query('tags'):
+            tags=self.tags.setdefault(docid,[])
+            if tag not in tags:
+                tags.append(tag)
+
+        #----Contributors, first and last names kept aligned----
+        for docid,first,last in db.query('contributors'):
+            self.firstnames.setdefault(docid,[]).append(first)
+            self.lastnames.setdefault(docid,[]).append(last)
+
+        #------------Keywords, duplicates removed------------
+        for docid,keyword in db.query('keywords'):
+            keywords=self.keywords.setdefault(docid,[])
+            if keyword not in keywords:
+                keywords.append(keyword)
+
+
+    def get(self,docid):
+        '''Get meta-data of a doc by documentId.
+
+        Return <result>: dict, keys are META_FIELDS. Multi-valued fields
+                         (tags, firstnames, lastname, keywords) are None
+                         if empty, a single value if only one, or a list.
+                         If <docid> is not in the library, all fields
+                         are [].
+
+        A new dict is returned on each call, so callers are free to
+        modify it.
+        '''
+
+        row=self.docs.get(docid)
+        if row is None:
+            return dict([(ff,[]) for ff in META_FIELDS])
+
+        result=dict(zip(DOC_FIELDS,row))
+        result['tags']=_squeeze(self.tags.get(docid))
+        result['firstnames']=_squeeze(self.firstnames.get(docid))
+        result['lastname']=_squeeze(self.lastnames.get(docid))
+        result['keywords']=_squeeze(self.keywords.get(docid))
+
+        return result
+
+
+
+class PathResolver(object):
+
+    def __init__(self,db):
+        '''Local file paths of documents in the library.
+
+        <db>: MendeleyDB obj.
+
+        The docid -> localUrl map is read with a single query. Each url
+        is converted to an absolute path on first request and the
+        result is kept, so later lookups are dict accesses.
+        '''
+
+        self.urls={}
+        self._paths={}
+
+        for docid,url in db.query('files'):
+            # Keep the 1st file if a doc has more than one
+            if docid not in self.urls:
+                self.urls[docid]=url
+
+
+    def urlToPath(self,url):
+        '''Convert a localUrl to an absolute path, cached by url
+        '''
+        if url not in self._paths:
+            self._paths[url]=converturl2abspath(url)
+        return self._paths[url]
+
+
+    def get(self,docid):
+        '''Get file path of a PDF using documentId
+
+        Return None if the doc has no file attached.
+        '''
+        url=self.urls.get(docid)
+        if url is None:
+            return None
+        return self.urlToPath(url)
+
+
+    def pathsFor(self,docids):
+        '''Get file paths of a list of docs
+
+        <docids>: list, documentIds.
+
+        Return <result>: dict, keys: documentId, values: absolute path,
+                         or None if the doc has no file attached.
+        '''
+        return dict([(ii,self.get(ii)) for ii in docids])
+
+
+
+class FolderTree(object):
+
+    def __init__(self,db):
+        '''Folder tree of the library.
+
+        <db>: MendeleyDB obj.
+
+        Folders are read with a single query into an id -> node map,
+        with the children of each folder listed. Full paths are cached
+        as they are resolved, so getting the path or subfolders of every
+        folder in the library takes linear time.
+
+        The number of docs directly in each folder is read with another
+        grouped query into <counts>, folders without docs are not in it.
+        '''
+
+        self.ids=[]      # all folder ids, in table order
+        self.names={}
+        self.parents={}
+        self.children={}
+        self.counts={}
+        self._paths={}
+
+        for fid,name,pid in db.iterFolders():
+            self.ids.append(fid)
+            self.names[fid]=name
+            self.parents[fid]=pid
+
+        # Top level folders have parentID -1 or 0
+        for fid in self.ids:
+            pid=self.parents[fid]
+            if pid in self.names:
+                self.children.setdefault(pid,[]).append(fid)
+
+        for fid,count in db.query('folder_counts'):
+            if fid in self.names:
+                self.counts[fid]=count
+
+
+    def find(self,name):
+        '''Get ids of folders named <name>, sorted by parentID
+        '''
+        fids=[ii for ii in self.ids if self.names[ii]==name]
+        fids.sort(key=lambda x: self.parents[x])
+        return fids
+
+
+    def subFolders(self,folderid):
+        '''Get ids of all subfolders (recursively) of a folder, sorted
+        '''
+        results=[]
+        stack=list(self.children.get(folderid,[]))
+        while stack:
+            fid=stack.pop()
+            results.append(fid)
+            stack.extend(self.children.get(fid,[]))
+
+        results.sort()
+        return results
+
+
+    def path(self,folderid):
+        '''Get folder name with tree structure, e.g. test/testsub/testsub2
+        '''
+
+        #-------Climb up to a root or a resolved folder-------
+        chain=[]
+        fid=folderid
+        while fid in self.names and fid not in self._paths:
+            chain.append(fid)
+            fid=self.parents[fid]
+
+        #-------------Resolve paths on the way down-------------
+        base=self._paths.get(fid)
+        for cid in reversed(chain):
+            name=self.names[cid]
+            base=name if base is None else u'%s/%s' %(base,name)
+            self._paths[cid]=base
+
+        return self._paths[folderid]
+
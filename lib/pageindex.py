@@ -0,0 +1,185 @@
+'''Spatial index of the lines and chars in a text box.
+
+Matching a highlight rect to the text under it used to scan every line
+of a box, and every char of the overlapping lines, building a dummy
+LTTextLine for each comparison. BoxIndex keeps the line and char bboxes
+of a box sorted, so the lines and chars under a rect are found with
+binary searches over a narrow candidate range.
+
+WordIndex does the same for the word boxes read with pdftotext.
+
+Overlap tests are the same as pdfminer's is_hoverlap() and is_voverlap(),
+ends included.
+
+
+# Copyright 2016 Guang-zhi XU
+#
+# This file is distributed under the terms of the
+# GPLv3 licence. See the LICENSE file for details.
+# You may use, distribute and modify this code under the
+# terms of the GPLv3 license.
+
+Update time: 2026-10-18 15:06:44.
+'''
+
+from bisect import bisect_left, bisect_right
+
+from pdfminer.layout import LTTextLine, LTTextLineHorizontal, LTChar, LTAnno
+
+EPS=1e-6
+
+
+def overlaps(bbox,rect):
+    '''Check if 2 [x0,y0,x1,y1] boxes overlap, ends included
+    '''
+    return rect[0]<=bbox[2] and bbox[0]<=rect[2] and\
+            rect[1]<=bbox[3] and bbox[1]<=rect[3]
+
+
+
+class BoxIndex(object):
+
+    def __init__(self,box,lines):
+        '''Spatial index of the lines and chars in a text box.
+
+        <box>: LTTextBox obj.
+        <lines>: list, objs in <box>, in reading order (see sortY() in
+                 readorder.py).
+
+        Text lines are indexed by their top y (descending, which is the
+        order of <lines>), chars of a line by their left x. The chars of
+        a line are indexed on first query.
+        '''
+
+        self.box=box
+        self.bbox=box.bbox
+        self.lines=lines
+
+        # Text lines, in the order of <lines>
+        self.linepos=[ii for ii,lii in enumerate(lines) if\
+                type(lii)==LTTextLine or type(lii)==LTTextLineHorizontal]
+        self._ykeys=[-lines[ii].bbox[3] for ii in self.linepos]
+        # Tolerance for rounding in bbox coordinates
+        self._maxh=max([lines[ii].height for ii in self.linepos]+[0])+EPS
+
+        # Char index of each line, keys: position in <lines>
+        self._chars={}
+
+
+    def overlaps(self,rect):
+        '''Check if <rect> overlaps the box
+        '''
+        return overlaps(self.bbox,rect)
+
+
+    def findLines(self,rect):
+        '''Find text lines overlapping <rect>
+
+        <rect>: list, [x1,y1,x2,y2] of a highlight.
+
+        A line overlaps <rect> if its top y is in [y1, y2+max line height],
+        and the exact test is run on those lines only.
+
+        Return <result>: list of ints, positions in <lines> of the
+                         overlapping lines, in the order of <lines>.
+        '''
+
+        # Keys are in ascending order as -top y
+        lo=bisect_left(self._ykeys,-(rect[3]+self._maxh))
+        hi=bisect_right(self._ykeys,-rect[1])
+
+        result=[]
+        for kk in range(lo,hi):
+            ii=self.linepos[kk]
+            if overlaps(self.lines[ii].bbox,rect):
+                result.append(ii)
+
+        return result
+
+
+    def _indexChars(self,ii):
+        objs=self.lines[ii]._objs
+        chars=[(cjj.x0,jj) for jj,cjj in enumerate(objs) if type(cjj)==LTChar]
+        chars.sort()
+        x0s=[cjj[0] for cjj in chars]
+        pos=[cjj[1] for cjj in chars]
+        annos=[jj for jj,cjj in enumerate(objs) if type(cjj)==LTAnno]
+        maxw=max([objs[jj].width for jj in pos]+[0])+EPS
+        self._chars[ii]=(x0s,pos,annos,maxw)
+        return self._chars[ii]
+
+
+    def lineText(self,ii,rect):
+        '''Get texts in a line under <rect>
+
+        <ii>: int, position of the line in <lines>.
+        <rect>: list, [x1,y1,x2,y2] of a highlight.
+
+        Return <texts>: list of strs, texts of chars overlapping <rect>,
+                        and of all LTAnno objs (spaces, line breaks) in
+                        the line, in the order of the line.
+        '''
+
+        if ii in self._chars:
+            x0s,pos,annos,maxw=self._chars[ii]
+        else:
+            x0s,pos,annos,maxw=self._indexChars(ii)
+
+        objs=self.lines[ii]._objs
+        lo=bisect_left(x0s,rect[0]-maxw)
+        hi=bisect_right(x0s,rect[2])
+        found=[pos[kk] for kk in range(lo,hi) if overlaps(objs[pos[kk]].bbox,rect)]
+
+        found.extend(annos)
+        found.sort()
+
+        return [objs[jj].get_text() for jj in found]
+
+
+
+class WordIndex(object):
+
+    def __init__(self,words):
+        '''Index of the word boxes in a page, by the y of their centers.
+
+        <words>: list of (x1, y1, x2, y2, text) of words in a page, as
+                 from getWordBoxes() in extracthl2.py.
+        '''
+
+        self.words=words
+        centers=[(0.5*(wii[1]+wii[3]),ii) for ii,wii in enumerate(words)]
+        centers.sort()
+        self._ycs=[cii[0] for cii in centers]
+        self._pos=[cii[1] for cii in centers]
+
+
+    def clip(self,rect):
+        '''Get text of words inside a highlight rect
+
+        <rect>: list, [x1,y1,x2,y2] of a highlight.
+
+        A word is taken if its center falls inside <rect>. Word boxes
+        can't tell which of their chars are under <rect>, so if a word
+        crosses the left or right edge of <rect>, None is returned, and
+        the text should be cropped char by char instead (pdftotext -x -y
+        -W -H).
+
+        Return <text>: str, words joined by spaces, in the order of <words>,
+                       or None if a word is only partly under <rect>.
+        '''
+
+        x1,y1,x2,y2=rect
+        lo=bisect_left(self._ycs,y1)
+        hi=bisect_right(self._ycs,y2)
+
+        found=[]
+        for kk in range(lo,hi):
+            ii=self._pos[kk]
+            wii=self.words[ii]
+            if wii[0]<x1<wii[2] or wii[0]<x2<wii[2]:
+                return None
+            if x1<=0.5*(wii[0]+wii[2])<=x2:
+                found.append(ii)
+        found.sort()
+
+        return u' '.join([self.words[ii][4] for ii in found])
@@ -0,0 +1,131 @@
+'''Reading order of layout objs and highlights.
+
+The boxes of a page are put in the reading order of 2-column PDFs: from
+top-down, from left to right column. They are first sorted by their
+distance to a diagonal of the page (see diagOrder()), then boxes with
+similar left x are put top-down (see fineTune()).
+
+The order of a page is computed once by readingOrder(), and kept with
+the page layout, also in the layout cache (see lib/layoutcache.py).
+
+Sorting is done on the positions of objs, with ties kept in their
+original order, so objs at the same position are all kept.
+
+
+# Copyright 2016 Guang-zhi XU
+#
+# This file is distributed under the terms of the
+# GPLv3 licence. See the LICENSE file for details.
+# You may use, distribute and modify this code under the
+# terms of the GPLv3 license.
+
+Update time: 2026-10-18 17:46:12.
+'''
+
+from numpy import sqrt, argsort
+
+
+
+#---------------------Sort box elements diagnoally---------------------
+def diagOrder(objs,width,height):
+    '''Sort objs diagnoally
+
+    <objs>: list, layout objs of a page.
+    <width>, <height>: float, page size.
+
+    Sort by measuring the perpendicular distance from the topleft corner
+    of an obj to the line (y=2h/w*x+h, with origin at bottom-left corner
+    of page).
+
+    Return <order>: list of ints, indices in <objs> in sorted order.
+    '''
+
+    dist=lambda x,y,w,h: abs(2.*h*x/w-y+h)/sqrt((2.*h/w)**2+1)
+    dists=[dist(jj.bbox[0],jj.bbox[3],width,height) for jj in objs]
+
+    return [int(ii) for ii in argsort(dists,kind='mergesort')]
+
+
+#-------------------------Fine tune box order-------------------------
+def fineTune(objs,order):
+    '''Fine tune box order
+
+    <objs>: list, layout objs of a page.
+    <order>: list of ints, indices in <objs>, as from diagOrder().
+
+    In one pass over <order>, swap neighbours that share similar x
+    coordinates of the top-left corner, if the 2nd is higher.
+
+    Return <order>: list of ints, the new order.
+    '''
+
+    order=list(order)
+    for ii in range(len(order)-1):
+        x0,y0=objs[order[ii]].bbox[0],objs[order[ii]].bbox[3]
+        x1,y1=objs[order[ii+1]].bbox[0],objs[order[ii+1]].bbox[3]
+
+        if abs(x0-x1)<=30 and y1-y0>1:
+            order[ii],order[ii+1]=order[ii+1],order[ii]
+
+    return order
+
+
+#-----------------------Reading order of a page-----------------------
+def pageOrder(layout):
+    '''Compute the reading order of the objs in a page
+
+    <layout>: LTPage obj.
+
+    Return <order>: list of ints, indices in <layout._objs>.
+    '''
+    order=diagOrder(layout._objs,layout.width,layout.height)
+    return fineTune(layout._objs,order)
+
+
+def readingOrder(layout):
+    '''Get the objs of a page in reading order
+
+    <layout>: LTPage obj.
+
+    The order is computed on the 1st call, and kept as <layout.order>.
+
+    Return <objs>: list, objs of <layout> in reading order.
+    '''
+    order=getattr(layout,'order',None)
+    if order is None:
+        order=pageOrder(layout)
+        layout.order=order
+
+    return [layout._objs[ii] for ii in order]
+
+
+
+
+#-------------------------Sort objs vertically-------------------------
+def sortY(objs,verbose=True):
+    '''Sort objs vertically
+
+    Sort objs by the y (top-down) then x coordinates of their top-left
+    corners.
+    '''
+    return sorted(objs,key=lambda ii: (-ii.bbox[3],ii.bbox[0]))
+
+
+#------------------------Sort objs horizontally------------------------
+def sortX(objs,verbose=True):
+    '''Sort objs horizontally
+
+    Sort objs by the x then y (top-down) coordinates of their top-left
+    corners.
+    '''
+    return sorted(objs,key=lambda ii: (ii.bbox[0],-ii.bbox[3]))
+
+
+#-------------------------Sort annos vertically-------------------------
+def sortAnnoY(objs,verbose=True):
+    '''Sort annotations vertically
+
+    Sort annotations (from Mendeley database) by (y,x) coordinates of the
+    topleft corner.
+    '''
+    return sorted(objs,key=lambda ii: (-ii['rect'][3],ii['rect'][0]))
@@ -0,0 +1,251 @@
+'''Supervised worker processes with per-task time and memory limits.
+
+A malformed or huge PDF can keep pdfminer or PyPDF2 busy for a very long
+time, or make them use GBs of memory, without ever raising an exception.
+
+Tasks are run in worker processes. While a task runs, the parent checks
+its wall time and the resident memory (RSS) of the worker. A worker over
+either limit is killed, the task reported as failed with the reason, and
+a new worker is started for the next tasks.
+
+Memory of workers is read from /proc, so the memory limit is only
+enforced on Linux. The time limit works everywhere.
+
+
+# Copyright 2016 Guang-zhi XU
+#
+# This file is distributed under the terms of the
+# GPLv3 licence. See the LICENSE file for details.
+# You may use, distribute and modify this code under the
+# terms of the GPLv3 license.
+
+Update time: 2026-10-18 19:02:14.
+'''
+
+import time
+import multiprocessing
+
+
+# Seconds between checks of running tasks
+POLL_INTERVAL=0.05
+
+
+
+def rssMB(pid):
+    '''Resident memory of a process, in MB, or None if unknown
+    '''
+    try:
+        with open('/proc/%d/status' %pid) as fin:
+            for line in fin:
+                if line.startswith('VmRSS:'):
+                    return int(line.split()[1])/1024.
+    except (IOError,OSError,ValueError):
+        pass
+    return None
+
+
+def _serve(conn):
+    '''Loop of a worker process: run (func, args) tasks from <conn>
+    '''
+    while True:
+        try:
+            task=conn.recv()
+        except (EOFError,IOError):
+            break
+        if task is None:
+            break
+        func,args=task
+        try:
+            result=('ok',func(*args))
+        except Exception as e:
+            result=('error','%s: %s' %(type(e).__name__,e))
+        conn.send(result)
+    conn.close()
+
+
+
+
+class Worker(object):
+
+    def __init__(self,timeout=None,maxmem=None):
+        '''A worker process running one task at a time, under limits.
+
+        <timeout>: float or None, max wall time of a task, in seconds.
+        <maxmem>: float or None, max resident memory of the worker while
+                  running a task, in MB.
+
+        The process is started on the first task, and again after it is
+        killed.
+        '''
+        self.timeout=timeout
+        self.maxmem=maxmem
+        self.proc=None
+        self.conn=None
+        self.t0=None
+        self.busy=False
+        self.nkilled=0
+
+    def start(self):
+        self.conn,childconn=multiprocessing.Pipe()
+        self.proc=multiprocessing.Process(target=_serve,args=(childconn,))
+        self.proc.daemon=True
+        self.proc.start()
+        childconn.close()
+
+    @property
+    def pid(self):
+        return None if self.proc is None else self.proc.pid
+
+    def submit(self,func,args):
+        '''Start running func(*args) in the worker
+        '''
+        if self.proc is None:
+            self.start()
+        self.t0=time.time()
+        self.busy=True
+        self.conn.send((func,args))
+
+    def poll(self):
+        '''Check the running task
+
+        Return None if the task is still running, else (status, value,
+        seconds). <status> is 'ok', with <value> the result of the task,
+        'error' if it raised, or 'killed' if a limit was hit, with
+        <value> the reason.
+        '''
+        sec=time.time()-self.t0
+        try:
+            if self.conn.poll():
+                status,value=self.conn.recv()
+                self.busy=False
+                return status,value,sec
+        except (EOFError,IOError):
+            self.kill()
+            return 'killed','worker died',sec
+
+        # Killed from outside (e.g. by the OOM killer) or crashed, with
+        # the pipe still open
+        if not self.proc.is_alive():
+            self.kill()
+            return 'killed','worker died',sec
+
+        if self.timeout is not None and sec>self.timeout:
+            self.kill()
+            return 'killed','timed out after %g s' %self.timeout,sec
+
+        if self.maxmem is not None:
+            mem=rssMB(self.proc.pid)
+            if mem is not None and mem>self.maxmem:
+                self.kill()
+                return 'killed','used over %g MB of memory' %self.maxmem,sec
+
+        return None
+
+    def run(self,func,args):
+        '''Run func(*args) in the worker and wait for it, see poll()
+        '''
+        self.submit(func,args)
+        while True:
+            result=self.poll()
+            if result is not None:
+                return result
+            time.sleep(POLL_INTERVAL)
+
+    def kill(self):
+        '''Kill the process, a new one is started by the next submit()
+        '''
+        if self.proc is not None:
+            self.proc.terminate()
+            self.proc.join()
+            self.conn.close()
+            self.nkilled+=1
+        self.proc=None
+        self.conn=None
+        self.busy=False
+
+    def close(self):
+        '''Stop the process, killing it if a task is still running
+        '''
+        if self.busy:
+            self.kill()
+        if self.proc is not None:
+            try:
+                self.conn.send(None)
+            except (IOError,OSError):
+                pass
+            self.proc.join()
+            self.conn.close()
+        self.proc=None
+        self.conn=None
+
+
+
+
+class SupervisedPool(object):
+
+    def __init__(self,jobs,timeout=None,maxmem=None):
+        '''Pool of supervised worker processes.
+
+        <jobs>: int, number of workers.
+        <timeout>, <maxmem>: limits of each task, see Worker.
+        '''
+        self.workers=[Worker(timeout,maxmem) for ii in range(jobs)]
+
+    def imap(self,func,argslist,maxahead=None):
+        '''Run func(*args) for each args in <argslist>
+
+        <argslist>: iterable of tuples. It is read lazily, as workers
+                    become free, so it can be a generator.
+        <maxahead>: int or None, max number of tasks running or done but
+                    not yet yielded. Default to twice the number of
+                    workers. Bounds the results held while a slow task
+                    holds back the ones after it.
+
+        Return an iterator of (status, value, worker pid, seconds), in the
+        order of <argslist>. See Worker.poll().
+        '''
+        if maxahead is None:
+            maxahead=2*len(self.workers)
+        argsiter=enumerate(argslist)
+        exhausted=False
+        running={}  #keys: worker index, values: task index
+        done={}     #keys: task index, values: results not yet yielded
+        nextin=0    #index of the next task to submit
+        nextidx=0   #index of the next result to yield
+
+        while not exhausted or len(running)>0 or len(done)>0:
+            for wii,worker in enumerate(self.workers):
+                if exhausted or nextin-nextidx>=maxahead:
+                    break
+                if wii in running:
+                    continue
+                try:
+                    idx,args=argsiter.next()
+                except StopIteration:
+                    exhausted=True
+                    break
+                worker.submit(func,args)
+                running[wii]=idx
+                nextin+=1
+
+            for wii in list(running):
+                worker=self.workers[wii]
+                pid=worker.pid
+                result=worker.poll()
+                if result is not None:
+                    status,value,sec=result
+                    done[running.pop(wii)]=(status,value,pid,sec)
+
+            if nextidx not in done and len(running)>0:
+                time.sleep(POLL_INTERVAL)
+            while nextidx in done:
+                yield done.pop(nextidx)
+                nextidx+=1
+
+    @property
+    def nkilled(self):
+        return sum([wii.nkilled for wii in self.workers])
+
+    def close(self):
+        for wii in self.workers:
+            wii.close()
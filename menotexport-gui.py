@@ -33,8 +33,7 @@ import tkMessageBox
 import menotexport
 import Queue
 import threading
-import sqlite3
-import pandas as pd
+import multiprocessing
 if sys.version_info[0]>=3:
     import tkinter as tk
     from tkinter import Frame
@@ -223,9 +222,12 @@ C:\Users\Your_name\AppData\Local\Mendeley Ltd\Mendeley Desktop\your_email@www.me
     def probeFolders(self):
         dbfile=self.db_entry.get()
         try:
-            db=sqlite3.connect(dbfile)
+            db=menotexport.mendeleydb.MendeleyDB(dbfile)
             self.menfolderlist=menotexport.getFolderList(db,None)   #(id, name)
-            self.foldernames=['All']+[ii[1] for ii in self.menfolderlist] #names to display
+            counts=db.getFolderTree().counts
+            #names to display, with number of docs in folder
+            self.foldernames=['All']+['%s (%d)' %(ii[1],counts[ii[0]])\
+                    for ii in self.menfolderlist]
             self.foldersmenu['values']=tuple(self.foldernames)
             self.foldersmenu.current(0)
             db.close()
@@ -316,6 +318,17 @@ C:\Users\Your_name\AppData\Local\Mendeley Ltd\Mendeley Desktop\your_email@www.me
         self.foldersmenu.current(0)
         self.foldersmenu.bind('<<ComboboxSelected>>',self.setfolder)
         self.foldersmenu.pack(side=tk.LEFT,padx=8)
+
+        #-------------------Number of jobs-------------------
+        jobslabel=tk.Label(subframe,text='Jobs:',bg='#bbb')
+        jobslabel.pack(side=tk.LEFT, padx=8)
+
+        self.jobs=tk.StringVar()
+        self.jobs.set('1')
+        self.jobs_spin=tk.Spinbox(subframe,from_=1,\
+                to=max(1,multiprocessing.cpu_count()),width=3,\
+                textvariable=self.jobs,state='readonly')
+        self.jobs_spin.pack(side=tk.LEFT,padx=8)
         
         #-------------------Quit button-------------------
         quit_button=tk.Button(subframe,text='Quit',\
@@ -427,6 +440,7 @@ C:\Users\Your_name\AppData\Local\Mendeley Ltd\Mendeley Desktop\your_email@www.me
 - Export .ris: Export meta-data and annotations to .ris files.\n
 - For import to Zotero: Exported .bib and/or .ris files have suitable format to import to Zotero.\n
 - Save separately: If on, save each PDF's annotations to a separate txt.\n
+- Jobs: Number of processes to extract highlights and notes from PDFs in parallel.\n
 - See README.md for more info.\n
 ''' %self.title
 
@@ -442,8 +456,8 @@ C:\Users\Your_name\AppData\Local\Mendeley Ltd\Mendeley Desktop\your_email@www.me
         self.menfolder=self.foldersmenu.get()
 
         # get (folderid, folder) for folder
-        for ii in self.menfolderlist:
-            if ii[1]==self.menfolder:
+        for ii,nameii in zip(self.menfolderlist,self.foldernames[1:]):
+            if nameii==self.menfolder:
                 folder_sel=[ii[0],ii[1].split('/')[-1]]
 
         action=[]
@@ -480,11 +494,17 @@ C:\Users\Your_name\AppData\Local\Mendeley Ltd\Mendeley Desktop\your_email@www.me
             self.check_ris.configure(state=tk.DISABLED)
             self.check_separate.configure(state=tk.DISABLED)
             self.check_iszotero.configure(state=tk.DISABLED)
+            self.jobs_spin.configure(state=tk.DISABLED)
 	    self.messagelabel.configure(text='Message (working...)')
 
             folder=None if self.menfolder=='All' else folder_sel
 
-            args=[dbfile,outdir,action,folder,separate,iszotero,True]
+            try:
+                jobs=max(1,int(self.jobs.get()))
+            except ValueError:
+                jobs=1
+
+            args=[dbfile,outdir,action,folder,separate,iszotero,True,False,jobs]
 
             self.workthread=WorkThread('work',False,self.stateq)
             self.workthread.deamon=True
@@ -516,6 +536,7 @@ C:\Users\Your_name\AppData\Local\Mendeley Ltd\Mendeley Desktop\your_email@www.me
                     self.check_bib.configure(state=tk.NORMAL)
                     self.check_separate.configure(state=tk.NORMAL)
                     self.check_iszotero.configure(state=tk.NORMAL)
+                    self.jobs_spin.configure(state='readonly')
                     self.messagelabel.configure(text='Message')
                     return
             except Queue.Empty:
@@ -564,6 +585,8 @@ def main():
 
 
 if __name__=='__main__':
+    # Needed by the extraction workers in frozen Windows executables
+    multiprocessing.freeze_support()
     main()
 
 
@@ -23,43 +23,39 @@ __version__='Menotexport v1.4'
 
 #---------------------Imports---------------------
 import sys,os
-import sqlite3
+import time
 import argparse
-import pandas as pd
+from collections import deque
+import multiprocessing
 from lib import extracttags
 from lib import extractnt
 from lib import exportpdf
 from lib import exportannotation
 from lib import export2bib
 from lib import export2ris
+from lib import mendeleydb
+from lib import layoutcache
+from lib import exportstate
+from lib import watchdog
 from lib.tools import printHeader, printInd, printNumHeader
 #from html2text import html2text
 from bs4 import BeautifulSoup
 from datetime import datetime
 
-if sys.version_info[0]>=3:
-    #---------------------Python3---------------------
-    from urllib.parse import unquote
-    from urllib.parse import urlparse
-else:
-    #--------------------Python2.7--------------------
-    from urllib import unquote
-    from urlparse import urlparse
-
-
-#-------Fetch a column from pandas dataframe-------
-fetchField=lambda x, f: x[f].unique().tolist()
-
 
 
 class FileAnno(object):
 
-    def __init__(self,docid,meta,highlights=None,notes=None):
+    def __init__(self,docid,meta,highlights=None,notes=None,filehash=None):
         '''Obj to hold annotations (highlights+notes) in a single PDF.
+
+        <filehash>: str or None, Mendeley hash of the PDF file, used as
+                    key of the layout cache.
         '''
 
         self.docid=docid
         self.meta=meta
+        self.filehash=filehash
         self.highlights=highlights
         self.notes=notes
         self.path=meta['path']
@@ -100,130 +96,53 @@ def convert2datetime(s):
     return datetime.strptime(s,'%Y-%m-%dT%H:%M:%SZ')
 
 
-def converturl2abspath(url):
-    '''Convert a url string to an absolute path
-    This is necessary for filenames with unicode strings.
-    '''
-
-    #--------------------For linux--------------------
-    path = unquote(str(urlparse(url).path)).decode("utf8") 
-    path=os.path.abspath(path)
-
-    if os.path.exists(path):
-        return path
-    else:
-        #-------------------For windowes-------------------
-        if url[5:8]==u'///':   
-            url=u'file://'+url[8:]
-            path=urlparse(url)
-            path=os.path.join(path.netloc,path.path)
-            path=unquote(str(path)).decode('utf8')
-            path=os.path.abspath(path)
-            return path
-
-
 def getMetaData(db, docid):
     '''Get meta-data of a doc by documentId.
-    '''
 
-    query=\
-    '''SELECT Documents.id,
-              Documents.citationkey,
-              Documents.title,
-              Documents.issue,
-              Documents.pages,
-              Documents.publication,
-              Documents.volume,
-              Documents.year,
-              Documents.doi,
-              Documents.abstract,
-              Documents.arxivId,
-              Documents.chapter,
-              Documents.city,
-              Documents.country,
-              Documents.edition,
-              Documents.institution,
-              Documents.isbn,
-              Documents.issn,
-              Documents.month,
-              Documents.day,
-              Documents.publisher,
-              Documents.series,
-              Documents.type,
-              Documents.read,
-              Documents.favourite,
-              DocumentTags.tag,
-              DocumentContributors.firstNames,
-              DocumentContributors.lastName,
-              DocumentKeywords.keyword
-       FROM Documents
-       LEFT JOIN DocumentTags
-           ON DocumentTags.documentId=Documents.id
-       LEFT JOIN DocumentContributors
-           ON DocumentContributors.documentId=Documents.id
-       LEFT JOIN DocumentKeywords
-           ON DocumentKeywords.documentId=Documents.id
+    Meta-data of the whole library is read once per connection (see
+    lib/mendeleydb.py), subsequent calls are dict lookups.
     '''
 
-    #------------------Get file meta data------------------
-    ret=db.execute(query)
-    data=ret.fetchall()
-    fields=['docid','citationkey','title','issue','pages',\
-            'publication','volume','year','doi','abstract',\
-            'arxivId','chapter','city','country','edition','institution',\
-            'isbn','issn','month','day','publisher','series','type',\
-            'read','favourite','tags','firstnames','lastname','keywords']
-
-    df=pd.DataFrame(data=data,columns=fields)
-    docdata=df[df.docid==docid]
-    result={}
-    for ff in fields:
-        fieldii=fetchField(docdata,ff)
-        result[ff]=fieldii[0] if len(fieldii)==1 else fieldii
-
-    return result
+    return db.getMeta(docid)
 
 
 #---------------Get file path of a PDF using documentId---------------
 def getFilePath(db,docid,verbose=True):
     '''Get file path of a PDF using documentId
-    '''
 
-    query=\
-    '''SELECT Files.localUrl, 
-              DocumentFiles.hash,
-              Documents.id
-       FROM Files
-       LEFT JOIN DocumentFiles
-           ON DocumentFiles.hash=Files.hash
-       LEFT JOIN Documents
-           ON Documents.id=DocumentFiles.documentId
+    Return None if the doc has no file attached. The docid -> path map
+    is read once per connection (see lib/mendeleydb.py).
     '''
 
-    ret=db.execute(query)
-    data=ret.fetchall()
-    df=pd.DataFrame(data=data,columns=['url','hash','docid'])
+    return db.getPath(docid)
 
-    #-----------------Search file path-----------------
-    pathdata=df[df.docid==docid]
-    if len(pathdata)==0:
-        return None
-    else:
-        url=fetchField(pathdata,'url')[0]
-        pth = converturl2abspath(url)
-        return pth
 
+#----------Get docids to filter annotation queries----------
+def _filterDocids(filterdocid):
+    '''Get docids to filter annotation queries
+
+    <filterdocid>: int, list of ints or None.
+    '''
+    if filterdocid is None or type(filterdocid) in [list,tuple,set]:
+        return filterdocid
+    return [filterdocid,]
 
-def getHighlights(db,results=None,folderid=None,foldername=None,filterdocid=None):
+
+def getHighlights(db,results=None,folderid=None,foldername=None,filterdocid=None,\
+        rows=None):
     '''Extract the coordinates of highlights from the Mendeley database
     and put results into a dictionary.
 
-    <db>: sqlite3.connection to Mendeley sqlite database.
+    <db>: MendeleyDB obj, connection to Mendeley sqlite database.
     <results>: dict or None, optional dictionary to hold the results. 
     <folderid>: int, id of given folder. If None, don't do folder filtering.
     <foldername>: str, name of folder corresponding to <folderid>. Used to
                   populate meta data.
-    <filterdocid>: int, id of document to query. If None, don't do docid filtering.
+    <filterdocid>: int, id of document to query, or list of ids. If None,
+                   don't do docid filtering.
+    <rows>: list or None, rows already read from the database (see
+            MendeleyDB.loadAnnosByFolder()). If given, use these instead
+            of querying, and ignore <folderid> and <filterdocid>.
 
     Return: <results>: dictionary containing the query results, with
             the following structure:
@@ -254,116 +173,27 @@ def getHighlights(db,results=None,folderid=None,foldername=None,filterdocid=None
     Update time: 2016-02-24 00:36:33.
     '''
 
-    query_new =\
-    '''SELECT Files.localUrl, FileHighlightRects.page,
-                    FileHighlightRects.x1, FileHighlightRects.y1,
-                    FileHighlightRects.x2, FileHighlightRects.y2,
-                    FileHighlights.createdTime,
-                    FileHighlights.documentId,
-                    DocumentFolders.folderid,
-                    Folders.name,
-                    FileHighlights.color
-            FROM Files
-            LEFT JOIN FileHighlights
-                ON FileHighlights.fileHash=Files.hash
-            LEFT JOIN FileHighlightRects
-                ON FileHighlightRects.highlightId=FileHighlights.id
-            LEFT JOIN DocumentFolders
-                ON DocumentFolders.documentId=FileHighlights.documentId
-            LEFT JOIN Folders
-                ON Folders.id=DocumentFolders.folderid
-            WHERE (FileHighlightRects.page IS NOT NULL)
-    '''
-    query_old =\
-    '''SELECT Files.localUrl, FileHighlightRects.page,
-                    FileHighlightRects.x1, FileHighlightRects.y1,
-                    FileHighlightRects.x2, FileHighlightRects.y2,
-                    FileHighlights.createdTime,
-                    FileHighlights.documentId,
-                    DocumentFolders.folderid,
-                    Folders.name
-            FROM Files
-            LEFT JOIN FileHighlights
-                ON FileHighlights.fileHash=Files.hash
-            LEFT JOIN FileHighlightRects
-                ON FileHighlightRects.highlightId=FileHighlights.id
-            LEFT JOIN DocumentFolders
-                ON DocumentFolders.documentId=FileHighlights.documentId
-            LEFT JOIN Folders
-                ON Folders.id=DocumentFolders.folderid
-            WHERE (FileHighlightRects.page IS NOT NULL)
-    '''
-
-    query_canonical_new =\
-    '''SELECT Files.localUrl, FileHighlightRects.page,
-                    FileHighlightRects.x1, FileHighlightRects.y1,
-                    FileHighlightRects.x2, FileHighlightRects.y2,
-                    FileHighlights.createdTime,
-                    FileHighlights.documentId,
-                    FileHighlights.color
-            FROM Files
-            LEFT JOIN FileHighlights
-                ON FileHighlights.fileHash=Files.hash
-            LEFT JOIN FileHighlightRects
-                ON FileHighlightRects.highlightId=FileHighlights.id
-            WHERE (FileHighlightRects.page IS NOT NULL)
-    '''
-
-    query_canonical_old =\
-    '''SELECT Files.localUrl, FileHighlightRects.page,
-                    FileHighlightRects.x1, FileHighlightRects.y1,
-                    FileHighlightRects.x2, FileHighlightRects.y2,
-                    FileHighlights.createdTime,
-                    FileHighlights.documentId
-            FROM Files
-            LEFT JOIN FileHighlights
-                ON FileHighlights.fileHash=Files.hash
-            LEFT JOIN FileHighlightRects
-                ON FileHighlightRects.highlightId=FileHighlights.id
-            WHERE (FileHighlightRects.page IS NOT NULL)
-    '''
-
-    if folderid is not None and filterdocid is None:
-        fstr='(Folders.id="%s")' %folderid
-        query_new=query_new+' AND\n'+fstr
-        query_old=query_old+' AND\n'+fstr
-
-    if filterdocid is not None:
-        fstr='(FileHighlights.documentId="%s")' %filterdocid
-        query_new=query_canonical_new+' AND\n'+fstr
-        query_old=query_canonical_old+' AND\n'+fstr
-
     if results is None:
         results={}
 
     #------------------Get highlights------------------
-    try:
-	ret = db.execute(query_new)
-	hascolor=True
-    except:
-	ret = db.execute(query_old)
-	hascolor=False
+    if rows is not None:
+        ret=rows
+    elif filterdocid is None:
+        ret=db.iterHighlights(folderid=folderid)
+    else:
+        ret=db.iterHighlights(docids=_filterDocids(filterdocid))
 
     for ii,r in enumerate(ret):
-        pth = converturl2abspath(r[0])
-        pg = r[1]
-        bbox = [r[2], r[3], r[4], r[5]] 
+        pth = db.urlToPath(r.url)
+        pg = r.page
+        bbox = [r.x1, r.y1, r.x2, r.y2]
         # [x1,y1,x2,y2], (x1,y1) being bottom-left,
         # (x2,y2) being top-right. Origin at bottom-left
-        cdate = convert2datetime(r[6])
-        docid=r[7]
-        if filterdocid is None:
-            folder=r[9]
-            if hascolor:
-                color=r[10]
-            else:
-                color=None
-        else:
-            folder=None
-            if hascolor:
-                color=r[8]
-            else:
-                color=None
+        cdate = convert2datetime(r.ctime)
+        docid=r.docid
+        folder=r.folder
+        color=r.color
 
         hlight = {'rect': bbox,\
                   'cdate': cdate,\
@@ -400,84 +230,54 @@ def getHighlights(db,results=None,folderid=None,foldername=None,filterdocid=None
             meta['folder']='' if folder is None else foldername
             results[docid]={'highlights':{pg:[hlight,]}}
             results[docid]['meta']=meta
+            results[docid]['filehash']=r.filehash
 
     return results
 
 
 #-------------------Get sticky notes-------------------
-def getNotes(db,results=None,folderid=None,foldername=None,filterdocid=None):
+def getNotes(db,results=None,folderid=None,foldername=None,filterdocid=None,\
+        rows=None):
     '''Extract notes from the Mendeley database
 
-    <db>: sqlite3.connection to Mendeley sqlite database.
+    <db>: MendeleyDB obj, connection to Mendeley sqlite database.
     <results>: dict or None, optional dictionary to hold the results. 
     <folderid>: int, id of given folder. If None, don't do folder filtering.
     <foldername>: str, name of folder corresponding to <folderid>. Used to
                   populate meta data.
-    <filterdocid>: int, id of document to query. If None, don't do docid filtering.
+    <filterdocid>: int, id of document to query, or list of ids. If None,
+                   don't do docid filtering.
+    <rows>: list or None, rows already read from the database (see
+            MendeleyDB.loadAnnosByFolder()). If given, use these instead
+            of querying, and ignore <folderid> and <filterdocid>.
 
     Return: <results>: dictionary containing the query results. See
             more in the doc of getHighlights()
     Update time: 2016-04-12 20:39:15.
     '''
 
-    query=\
-    '''SELECT Files.localUrl, FileNotes.page,
-                    FileNotes.x, FileNotes.y,
-                    FileNotes.author, FileNotes.note,
-                    FileNotes.modifiedTime,
-                    FileNotes.documentId,
-                    DocumentFolders.folderid,
-                    Folders.name
-            FROM Files
-            LEFT JOIN FileNotes
-                ON FileNotes.fileHash=Files.hash
-            LEFT JOIN DocumentFolders
-                ON DocumentFolders.documentId=FileNotes.documentId
-            LEFT JOIN Folders
-                ON Folders.id=DocumentFolders.folderid
-            WHERE (FileNotes.page IS NOT NULL)
-    '''
-
-    query_canonical=\
-    '''SELECT Files.localUrl, FileNotes.page,
-                    FileNotes.x, FileNotes.y,
-                    FileNotes.author, FileNotes.note,
-                    FileNotes.modifiedTime,
-                    FileNotes.documentId
-            FROM Files
-            LEFT JOIN FileNotes
-                ON FileNotes.fileHash=Files.hash
-            WHERE (FileNotes.page IS NOT NULL)
-    '''
-
-    if folderid is not None and filterdocid is None:
-        fstr='(Folders.id="%s")' %folderid
-        query=query+' AND\n'+fstr
-
-    if filterdocid is not None:
-        fstr='(FileNotes.documentId="%s")' %filterdocid
-        query=query_canonical+' AND\n'+fstr
-
     if results is None:
         results={}
 
     #------------------Get notes------------------
-    ret = db.execute(query)
+    if rows is not None:
+        ret=rows
+    elif filterdocid is None:
+        ret=db.iterNotes(folderid=folderid)
+    else:
+        ret=db.iterNotes(docids=_filterDocids(filterdocid))
 
     for ii,r in enumerate(ret):
-        pth = converturl2abspath(r[0])
-   
-        pg = r[1]
-        bbox = [r[2], r[3], r[2]+30, r[3]+30] 
+        pth = db.urlToPath(r.url)
+
+        pg = r.page
+        bbox = [r.x, r.y, r.x+30, r.y+30]
         # needs a rectangle however size does not matter
-        author=r[4]
-        txt = r[5]
-        cdate = convert2datetime(r[6])
-        docid=r[7]
-        if filterdocid is None:
-            folder=r[9]
-        else:
-            folder=None
+        author=r.author
+        txt = r.note
+        cdate = convert2datetime(r.mtime)
+        docid=r.docid
+        folder=r.folder
 
         note = {'rect': bbox,\
                 'author':author,\
@@ -520,78 +320,44 @@ def getNotes(db,results=None,folderid=None,foldername=None,filterdocid=None):
 
 
 #-------------------Get side-bar notes-------------------
-def getDocNotes(db,results=None,folderid=None,foldername=None,filterdocid=None):
+def getDocNotes(db,results=None,folderid=None,foldername=None,filterdocid=None,\
+        rows=None):
     '''Extract side-bar notes from the Mendeley database
 
-    <db>: sqlite3.connection to Mendeley sqlite database.
+    <db>: MendeleyDB obj, connection to Mendeley sqlite database.
     <results>: dict or None, optional dictionary to hold the results. 
     <folderid>: int, id of given folder. If None, don't do folder filtering.
     <foldername>: str, name of folder corresponding to <folderid>. Used to
                   populate meta data.
-    <filterdocid>: int, id of document to query. If None, don't do docid filtering.
+    <filterdocid>: int, id of document to query, or list of ids. If None,
+                   don't do docid filtering.
+    <rows>: list or None, rows already read from the database (see
+            MendeleyDB.loadAnnosByFolder()). If given, use these instead
+            of querying, and ignore <folderid> and <filterdocid>.
 
     Return: <results>: dictionary containing the query results. with
             See the doc in getHighlights().
     Update time: 2016-04-12 20:44:38.
     '''
 
-    query=\
-    '''SELECT DocumentNotes.text,
-              DocumentNotes.documentId,
-              DocumentNotes.baseNote,
-              DocumentFiles.hash,
-              Documents.title,
-              DocumentFolders.folderid,
-              Folders.name
-            FROM DocumentNotes
-            LEFT JOIN DocumentFolders
-                ON DocumentFolders.documentId=DocumentNotes.documentId
-            LEFT JOIN Folders
-                ON Folders.id=DocumentFolders.folderid
-            LEFT JOIN DocumentFiles
-                ON DocumentFiles.documentId=DocumentNotes.documentId
-            LEFT JOIN Documents
-                ON Documents.id=DocumentNotes.documentId
-            WHERE (DocumentNotes.documentId IS NOT NULL)
-    '''
-    query_canonical=\
-    '''SELECT DocumentNotes.text,
-              DocumentNotes.documentId,
-              DocumentNotes.baseNote,
-              DocumentFiles.hash,
-              Documents.title
-            FROM DocumentNotes
-            LEFT JOIN DocumentFiles
-                ON DocumentFiles.documentId=DocumentNotes.documentId
-            LEFT JOIN Documents
-                ON Documents.id=DocumentNotes.documentId
-            WHERE (DocumentNotes.documentId IS NOT NULL)
-    '''
-
-    if filterdocid is None and folderid is not None:
-        fstr='(Folders.id="%s")' %folderid
-        query=query+' AND\n'+fstr
-
-    if filterdocid is not None:
-        fstr='(Documents.id="%s")' %filterdocid
-        query=query_canonical+' AND\n'+fstr
-
     if results is None:
         results={}
 
     #------------------Get notes------------------
-    ret = db.execute(query)
+    if rows is not None:
+        ret=rows
+    elif filterdocid is None:
+        ret=db.iterDocNotes(folderid=folderid)
+    else:
+        ret=db.iterDocNotes(docids=_filterDocids(filterdocid))
 
     for ii,r in enumerate(ret):
-        docnote=r[0]
-        docid=r[1]
-        basenote=r[2]
-        title=r[4]
-        if filterdocid is None:
-            folder=r[6]
-        else:
-            folder=None
-        #dochash=r[5]
+        docnote=r.text
+        docid=r.docid
+        basenote=r.basenote
+        title=r.title
+        folder=r.folder
+        #dochash=r.hash
         pg=1
 
         if docnote is not None and basenote is not None\
@@ -663,7 +429,8 @@ def reformatAnno(annodict):
     for kk,vv in annodict.items():
         annoii=FileAnno(kk,vv['meta'],\
             highlights=vv.get('highlights',{}),\
-            notes=vv.get('notes',{}))
+            notes=vv.get('notes',{}),\
+            filehash=vv.get('filehash'))
         result[kk]=annoii
 
     return result
@@ -685,10 +452,11 @@ def getOtherDocs(db,folderid,foldername,annodocids,verbose=True):
     otherdocids=list(otherdocids)
 
     #------------------Get meta data------------------
+    paths=db.pathsFor(otherdocids)
     result=[]
     for ii in otherdocids:
         docii=getMetaData(db,ii)
-        docii['path']=getFilePath(db,ii) #Local file path, can be None
+        docii['path']=paths[ii] #Local file path, can be None
         docii['folder']=foldername
         result.append(docii)
 
@@ -706,10 +474,11 @@ def getOtherCanonicalDocs(db,alldocids,annodocids,verbose=True):
     otherdocids=list(otherdocids)
 
     #------------------Get meta data------------------
+    paths=db.pathsFor(otherdocids)
     result=[]
     for ii in otherdocids:
         docii=getMetaData(db,ii)
-        docii['path']=getFilePath(db,ii) #Local file path, can be None
+        docii['path']=paths[ii] #Local file path, can be None
         docii['folder']='Canonical'
         result.append(docii)
 
@@ -717,31 +486,19 @@ def getOtherCanonicalDocs(db,alldocids,annodocids,verbose=True):
 
 
 #----------Get a list of docids from a folder--------------
-def getFolderDocList(db,folderid,verbose=True):
+def getFolderDocList(db,folderid,verbose=True,arraysize=None):
     '''Get a list of docids from a folder
-    '''
 
-    query=\
-    '''SELECT Documents.id,
-              DocumentFolders.folderid,
-              Folders.name
-       FROM Documents
-       LEFT JOIN DocumentFolders
-           ON Documents.id=DocumentFolders.documentId
-       LEFT JOIN Folders
-           ON Folders.id=DocumentFolders.folderid
+    <db>: MendeleyDB obj, connection to the database.
+    <folderid>: int, folder id. If None, get all docs in the library.
+    <arraysize>: int or None, if given, read rows in batches of this
+                 size. See MendeleyDB.iterRows().
     '''
 
     if folderid is not None:
-        fstr='(Folders.id="%s")' %folderid
-        fstr='WHERE '+fstr
-        query=query+' '+fstr
-
-    #------------------Get docids------------------
-    ret=db.execute(query)
-    data=ret.fetchall()
-    df=pd.DataFrame(data=data,columns=['docid','folderid','folder'])
-    docids=fetchField(df,'docid')
+        docids=db.docIds('folder_docs',(folderid,),arraysize)
+    else:
+        docids=db.docIds('all_docs',arraysize=arraysize)
 
     return docids
 
@@ -749,21 +506,9 @@ def getFolderDocList(db,folderid,verbose=True):
 
 
 #--------------Get canonical document ids----------------
-def getCanonicals(db,verbose=True):
-
-    query=\
-    '''SELECT Documents.id,
-              DocumentFolders.folderId
-       FROM Documents
-       LEFT JOIN DocumentFolders
-           ON DocumentFolders.documentId=Documents.id
-       WHERE (DocumentFolders.folderId IS NULL)
-    '''
+def getCanonicals(db,verbose=True,arraysize=None):
 
-    ret=db.execute(query)
-    data=ret.fetchall()
-    df=pd.DataFrame(data=data,columns=['docid','folderid'])
-    canonical_doc_ids=fetchField(df,'docid')
+    canonical_doc_ids=db.docIds('canonical_docs',arraysize=arraysize)
 
     return [int(ii) for ii in canonical_doc_ids]
 
@@ -788,48 +533,36 @@ def getFolderList(db,folder,verbose=True):
     Update time: 2016-06-16 19:38:15.
     '''
 
-    query=\
-    '''SELECT Folders.id,
-              Folders.name,
-              Folders.parentID
-       FROM Folders
-    '''
-
     #-----------------Get all folders-----------------
-    ret=db.execute(query)
-    data=ret.fetchall()
-    df=pd.DataFrame(data=data,columns=['folderid','folder','parentID'])
-    allfolderids=fetchField(df,'folderid')
+    tree=db.getFolderTree()
 
     #---------------Select target folder---------------
     if folder is None:
-        folderids=allfolderids
+        folderids=list(tree.ids)
     if type(folder) is str:
         # Select the given folder, if more than 1 name match, select the
         # one with lowest parentID.
-        seldf=df[df.folder==folder].sort_values('parentID')
-        folderids=fetchField(seldf,'folderid')
+        folderids=tree.find(folder)
     elif type(folder) is tuple or type(folder) is list:
-        seldf=df[(df.folderid==folder[0]) & (df.folder==folder[1])]
-        folderids=fetchField(seldf,'folderid')
+        folderids=[ii for ii in tree.find(folder[1]) if ii==folder[0]]
 
     #----------------Get all subfolders----------------
     if folder is not None:
         folderids2=[]
         for ff in folderids:
             folderids2.append(ff)
-            subfs=getSubFolders(df,ff)
+            subfs=getSubFolders(tree,ff)
             folderids2.extend(subfs)
     else:
         folderids2=folderids
 
     #---------------Remove empty folders---------------
-    folderids2=[ff for ff in folderids2 if not isFolderEmpty(db,ff)]
+    folderids2=[ff for ff in folderids2 if tree.counts.get(ff,0)>0]
 
     #---Get names and tree structure of all non-empty folders---
     folders=[]
     for ff in folderids2:
-        folders.append(getFolderTree(df,ff))
+        folders.append(getFolderTree(tree,ff))
 
     #----------------------Return----------------------
     if folder is None:
@@ -845,144 +578,396 @@ def getFolderList(db,folder,verbose=True):
 #--------------------Check a folder is empty or not--------------------
 def isFolderEmpty(db,folderid,verbose=True):
     '''Check a folder is empty or not
-    '''
 
-    query=\
-    '''SELECT Documents.title,
-              DocumentFolders.folderid,
-              Folders.name
-       FROM Documents
-       LEFT JOIN DocumentFolders
-           ON Documents.id=DocumentFolders.documentId
-       LEFT JOIN Folders
-           ON Folders.id=DocumentFolders.folderid
+    Doc counts of all folders are read once per connection (see
+    lib/mendeleydb.py).
     '''
 
-    fstr='(Folders.id="%s")' %folderid
-    fstr='WHERE '+fstr
-    query=query+' '+fstr
-
-    ret=db.execute(query)
-    data=ret.fetchall()
-    if len(data)==0:
-        return True
-    else:
-        return False
+    return db.getFolderTree().counts.get(folderid,0)==0
 
 
 #-------------------Get subfolders of a given folder-------------------
-def getSubFolders(df,folderid,verbose=True):
+def getSubFolders(tree,folderid,verbose=True):
     '''Get subfolders of a given folder
 
-    <df>: dataframe, contains all folders (including empty ones) id, name and parentID.
+    <tree>: FolderTree obj, contains all folders (including empty ones).
+            See lib/mendeleydb.py.
     <folderid>: int, folder id
     '''
-    getParentId=lambda df,id: fetchField(df[df.folderid==id],'parentID')[0]
-    results=[]
-
-    for ii in range(len(df)):
-        idii,fii,pii=df.loc[ii]
-
-        cid=idii
-        while True:
-            pid=getParentId(df,cid)
-            if pid==-1 or pid==0:
-                break
-            if pid==folderid:
-                results.append(idii)
-                break
-            else:
-                cid=pid
 
-    results.sort()
-    return results
+    return tree.subFolders(folderid)
 
 
 #-------------Get folder tree structure of a given folder-------------
-def getFolderTree(df,folderid,verbose=True):
+def getFolderTree(tree,folderid,verbose=True):
     '''Get folder tree structure of a given folder
 
-    <df>: dataframe, contains all folders (including empty ones) id, name and parentID.
+    <tree>: FolderTree obj, contains all folders (including empty ones).
+            See lib/mendeleydb.py.
     <folderid>: int, folder id
     '''
 
-    getFolderName=lambda df,id: fetchField(df[df.folderid==id],'folder')[0]
-    getParentId=lambda df,id: fetchField(df[df.folderid==id],'parentID')[0]
+    return folderid,tree.path(folderid)
 
-    folder=getFolderName(df,folderid)
 
-    #------------Back track tree structure------------
-    cid=folderid
-    while True:
-        pid=getParentId(df,cid)
-        if pid==-1 or pid==0:
-            break
-        else:
-            pfolder=getFolderName(df,pid)
-            folder=u'%s/%s' %(pfolder,folder)
-        cid=pid
 
-    return folderid,folder
+#------------Extract annotations from a single PDF------------
+def extractDocAnnos(annoii,action,verbose,cache=None,clip=False):
+    '''Extract highlights and notes from a single PDF
 
+    <annoii>: FileAnno obj, annotations of the PDF.
+    <action>: list, possible elements: m, n, e, b.
+    <cache>: LayoutCache obj or None, cache of analysed page layouts.
+             See lib/layoutcache.py.
+    <clip>: bool, if True, only analyse the layout of the text near the
+            highlights. See lib/clipdevice.py.
+
+    Return <hltexts>: list, extracted highlights.
+           <nttexts>: list, extracted notes.
+           <failed>: bool, True if any of the extractions failed.
+    '''
 
+    fii=annoii.path
+    failed=False
 
-def extractAnnos(annotations,action,verbose):
+    if 'm' in action:
+        from lib import extracthl2
 
-    faillist=[]
-    annotations2={}  #keys: docid, values: extracted annotations
+        try:
+            #------ Check if pdftotext is available--------
+            if extracthl2.checkPdftotext():
+                if verbose:
+                    printInd('Retrieving highlights using pdftotext ...',4,prefix='# <Menotexport>:')
+                hltexts=extracthl2.extractHighlights2(fii,annoii,verbose,cache,clip)
+            else:
+                if verbose:
+                    printInd('Retrieving highlights using pdfminer ...',4,prefix='# <Menotexport>:')
+                hltexts=extracthl2.extractHighlights(fii,annoii,verbose,cache,clip)
+        except:
+            failed=True
+            hltexts=[]
+    else:
+        hltexts=[]
+
+    if 'n' in action:
+        if verbose:
+            printInd('Retrieving notes...',4,prefix='# <Menotexport>:')
+        try:
+            nttexts=extractnt.extractNotes(fii,annoii,verbose)
+        except:
+            failed=True
+            nttexts=[]
+    else:
+        nttexts=[]
+
+    return hltexts,nttexts,failed
+
+
+#--------Export and extract annotations from a single PDF--------
+def processDoc(annoii,action,verbose,pdfdir=None,cache=None,clip=False):
+    '''Export the annotated PDF of a doc and extract its annotations
+
+    <annoii>: FileAnno obj, annotations of the PDF.
+    <action>: list, possible elements: m, n, e, b.
+    <pdfdir>: str or None, if given, folder to export the annotated PDF to.
+    <cache>: LayoutCache obj or None, cache of analysed page layouts.
+    <clip>: bool, if True, only analyse the layout of the text near the
+            highlights. See lib/clipdevice.py.
+
+    Return <exportfailed>: bool, True if the PDF export failed.
+           <hltexts>, <nttexts>, <failed>: see extractDocAnnos().
+    '''
+
+    exportfailed=False
+    if pdfdir is not None:
+        try:
+            exportpdf.exportPdf(annoii.path,pdfdir,annoii,verbose)
+        except:
+            exportfailed=True
+
+    try:
+        hltexts,nttexts,failed=extractDocAnnos(annoii,action,verbose,cache,\
+                clip)
+    except:
+        hltexts,nttexts,failed=[],[],True
+
+    return exportfailed,hltexts,nttexts,failed
+
+
+def _docWorker(job):
+    '''Run processDoc() in a pool worker
+
+    <job>: tuple, (FileAnno obj, action, folder to export the PDF to or
+           None, LayoutCache obj or None, clip).
+
+    Return (exportfailed, hltexts, nttexts, failed).
+    '''
+    annoii,action,pdfdir,cache,clip=job
+    return processDoc(annoii,action,False,pdfdir,cache,clip)
+
+
+class ExtractPool(object):
+
+    def __init__(self,jobs,timeout=None,maxmem=None):
+        '''Supervised worker processes to export and extract PDFs.
+
+        <jobs>: int, number of worker processes.
+        <timeout>: float or None, max time to spend on a PDF, in seconds.
+        <maxmem>: float or None, max memory of a worker, in MB.
+
+        A worker over a limit is killed and replaced, and its PDF is
+        failed, see lib/watchdog.py. Keeps the number of docs and the
+        time spent by each worker, for report().
+        '''
+        self.jobs=jobs
+        self.pool=watchdog.SupervisedPool(jobs,timeout,maxmem)
+        self.stats={}   #keys: worker pid, values: [num of docs, seconds]
+        self.t0=time.time()
+
+    def imap(self,jobs):
+        '''Run _docWorker() on <jobs>, results come in the order of <jobs>
+
+        <jobs>: iterable of (docid, FileAnno obj, action, pdfdir, cache,
+                clip), read lazily. See SupervisedPool.imap().
+
+        Return an iterator of (docid, exportfailed, hltexts, nttexts,
+        failed, worker pid, time in seconds). <exportfailed> and <failed>
+        are True if the export or extraction failed, or a str, the
+        reason, if the worker was killed.
+        '''
+        pending=deque()  #docids, pdfdirs and actions of jobs submitted
+
+        def tasks():
+            for jobii in jobs:
+                pending.append((jobii[0],jobii[3],jobii[2]))
+                yield (jobii[1:],)
+
+        for status,value,pid,sec in self.pool.imap(_docWorker,tasks()):
+            idii,pdfdir,action=pending.popleft()
+            # Extraction only fails with the task if it was asked for
+            isextract='m' in action or 'n' in action
+            statii=self.stats.setdefault(pid,[0,0.])
+            statii[0]+=1
+            statii[1]+=sec
+            if status=='ok':
+                exportfailed,hltexts,nttexts,failed=value
+            elif status=='killed':
+                exportfailed=False if pdfdir is None else value
+                hltexts,nttexts=[],[]
+                failed=value if isextract else False
+            else:
+                exportfailed=pdfdir is not None
+                hltexts,nttexts,failed=[],[],isextract
+            yield idii,exportfailed,hltexts,nttexts,failed,pid,sec
+
+    def close(self):
+        self.pool.close()
+
+    def report(self):
+        '''Print the throughput of each worker
+        '''
+        if len(self.stats)==0:
+            return
+        printHeader('Extraction workers (%d jobs, %.1f s wall time):'\
+                %(self.jobs,time.time()-self.t0),2)
+        for ii,pid in enumerate(sorted(self.stats)):
+            num,sec=self.stats[pid]
+            rate=num/sec if sec>0 else 0.
+            printInd('Worker %d (pid %d): %d docs in %.1f s, %.2f docs/s'\
+                    %(ii+1,pid,num,sec,rate),2)
+        if self.pool.nkilled>0:
+            printInd('%d workers killed over the limits and restarted.'\
+                    %self.pool.nkilled,2)
+
+
+
+def iterDocs(annotations,action,verbose,pool=None,cache=None,state=None,\
+        clip=False,pdfdir=None):
+    '''Export PDFs and extract highlights and notes, one doc at a time
+
+    <annotations>: dict, keys: documentId; values: FileAnno objs.
+    <action>: list, possible elements: m, n, e, b.
+    <pool>: ExtractPool obj or None. If given, process docs in the
+            workers of the pool, in parallel and under its limits, else
+            one after another.
+    <cache>: LayoutCache obj or None, cache of analysed page layouts.
+    <state>: ExportState obj or None. If given, reuse the highlights saved
+             in previous exports for docs whose highlights have not
+             changed, and save the newly extracted ones. See
+             lib/exportstate.py.
+    <clip>: bool, if True, only analyse the layout of the text near the
+            highlights. See lib/clipdevice.py.
+    <pdfdir>: str or None, if given, export the annotated PDFs to this
+              folder.
+
+    Docs are processed as the results are consumed, so they can be
+    written out one by one. With a pool, at most a few docs per worker
+    are processed ahead (see SupervisedPool.imap()).
+
+    Yield (docid, FileAnno obj, exportfailed, failed), in the order of
+    <annotations>, with the extracted highlights and notes set in the
+    FileAnno obj. <exportfailed> and <failed> are True if the export or
+    extraction failed, or a str, the reason, if a worker was killed.
+    '''
 
-    #-----------Loop through documents---------------
     num=len(annotations)
     docids=annotations.keys()
-    for ii,idii in enumerate(docids):
-        annoii=annotations[idii]
-        fii=annoii.path
-        fnameii=annoii.filename
+
+    fps={}      #keys: docid, values: fingerprint of highlights
+    saved={}    #keys: docid, values: highlights saved in state
+    # Notes only, for docs with saved highlights
+    ntaction=[aii for aii in action if aii!='m']
+
+    def jobs():
+        for idii in docids:
+            annoii=annotations[idii]
+            actionii=action
+            #-------Reuse highlights of unchanged docs-------
+            if state is not None and 'm' in action:
+                fps[idii]=exportstate.fingerprint(annoii)
+                hltexts=state.get(idii,fps[idii],annoii.meta)
+                if hltexts is not None:
+                    saved[idii]=hltexts
+                    actionii=ntaction
+            yield idii,annoii,actionii,pdfdir,cache,clip
+
+    if pool is not None:
+        results=pool.imap(jobs())
+    else:
+        joblist=jobs()
+
+    #-----------Loop through documents---------------
+    for ii in range(num):
+        if pool is None:
+            idii,annoii,actionii=joblist.next()[:3]
+        else:
+            idii,exportfailed,hltexts,nttexts,failed=results.next()[:5]
+            annoii=annotations[idii]
 
         if verbose:
             printNumHeader('Processing file:',ii+1,num,3)
-            printInd(fnameii,4)
-
-        if 'm' in action:
-            from lib import extracthl2
-
-            try:
-	        #------ Check if pdftotext is available--------
-	        if extracthl2.checkPdftotext():
-		    if verbose:
-			printInd('Retrieving highlights using pdftotext ...',4,prefix='# <Menotexport>:')
-                    hltexts=extracthl2.extractHighlights2(fii,annoii,verbose)
-	        else:
-		    if verbose:
-			printInd('Retrieving highlights using pdfminer ...',4,prefix='# <Menotexport>:')
-                    hltexts=extracthl2.extractHighlights(fii,annoii,verbose)
-            except:
-                faillist.append(fnameii)
-                hltexts=[]
-        else:
-            hltexts=[]
+            printInd(annoii.filename,4)
+
+        if pool is None:
+            exportfailed,hltexts,nttexts,failed=processDoc(annoii,actionii,\
+                    verbose,pdfdir,cache,clip)
 
-        if 'n' in action:
+        if idii in saved:
             if verbose:
-                printInd('Retrieving notes...',4,prefix='# <Menotexport>:')
-            try:
-                nttexts=extractnt.extractNotes(fii,annoii,verbose)
-            except:
-                faillist.append(fnameii)
-                nttexts=[]
-        else:
-            nttexts=[]
+                printInd('Highlights unchanged, reusing previous results.',4,\
+                        prefix='# <Menotexport>:')
+            hltexts=saved.pop(idii)
+        elif idii in fps and not failed:
+            state.put(idii,fps[idii],hltexts)
+        fps.pop(idii,None)
 
         annoii.highlights=hltexts
         annoii.notes=nttexts
-        annotations2[idii]=annoii
 
-    return annotations2,faillist
+        yield idii,annoii,exportfailed,failed
+
+
+def _failName(fname,failed):
+    '''Name of a failed file in fail lists, with the reason if any
+    '''
+    if failed is True:
+        return fname
+    return '%s (%s)' %(fname,failed)
+
+
+def exportDocs(annotations,outdir,outdir_folder,allfolders,action,separate,\
+        iszotero,verbose,pool=None,cache=None,state=None,clip=False):
+    '''Export docs with annotations, one doc at a time
+
+    <annotations>: dict, keys: documentId; values: FileAnno objs.
+    <outdir>: str, output directory path.
+    <outdir_folder>: str, output directory of the folder.
+    <allfolders>: bool, user chooses to process all folders or one folder.
+    <action>: list, possible elements: m, n, e, b.
+    <separate>: bool, whether save one output for each file or all files.
+    <iszotero>: bool, whether exported .bib is reformated to cater to zotero import or not.
+    <pool>, <cache>, <state>, <clip>: see iterDocs().
+
+    Each doc goes through PDF export and extraction (see iterDocs()),
+    then is written to the txt, .bib and .ris outputs before the next
+    doc is read, so outputs grow as PDFs are processed, and the texts of
+    only a few docs are held at a time. Docs are dropped from
+    <annotations> once written. The file of annotations grouped by tags
+    is written at the end, from the texts kept for it.
+
+    Return <exportfaillist>, <annofaillist>, <bibfaillist>, <risfaillist>:
+           lists, names of files failed.
+    '''
+
+    exportfaillist=[]
+    annofaillist=[]
+    bibfaillist=[]
+    risfaillist=[]
+
+    istxt='m' in action or 'n' in action
+    isfile=True if 'p' in action else False
+    # <outdir> is the base folder to save outputs, specified by user
+    # <bibfolder> is the folder to save .bib file, which is <outdir> if <allfolders> is True,
+    # or <outdir>/<folder_tree> otherwise.
+    bibfolder=outdir if allfolders else outdir_folder
+    pdfdir=outdir_folder if 'p' in action else None
+
+    #---------Open the txt output of all docs---------
+    if istxt and not separate:
+        abpath_out=exportannotation.getOutFile(outdir_folder,action)
+        if verbose:
+            printInd('Exporting all annotations to:',3)
+            printInd(abpath_out,4)
+    else:
+        abpath_out=None
+    tagsdict={}
+
+    if verbose:
+        printHeader('Exporting and extracting annotations from PDFs ...',2)
+
+    for idii,annoii,exportfailed,failed in iterDocs(annotations,action,\
+            verbose,pool,cache,state,clip,pdfdir):
+
+        if exportfailed:
+            exportfaillist.append(_failName(annoii.filename,exportfailed))
+        if failed:
+            annofaillist.append(_failName(annoii.filename,failed))
+
+        #------------Export annotations to txt------------
+        # Nothing to write if extraction failed on the whole doc, which
+        # is listed above already
+        isempty=len(annoii.highlights)==0 and len(annoii.notes)==0
+        if istxt and not (failed and isempty):
+            flist=exportannotation.exportDocAnno(annoii,outdir_folder,\
+                    action,abpath_out,verbose)
+            annofaillist.extend(flist)
+            extracttags.addDocTags(tagsdict,annoii)
+
+        #----------Export meta and anno to bib file----------
+        if 'b' in action:
+            flist=export2bib.exportAnno2Bib({idii:annoii},outdir,\
+                bibfolder,allfolders,isfile,iszotero,verbose)
+            bibfaillist.extend(flist)
+
+        #----------Export meta and anno to ris file----------
+        if 'r' in action:
+            flist=export2ris.exportAnno2Ris({idii:annoii},outdir,\
+                bibfolder,allfolders,isfile,iszotero,verbose)
+            risfaillist.extend(flist)
+
+        del annotations[idii]
+
+    #--------Export annotations grouped by tags--------
+    if istxt:
+        extracttags.exportAnno(tagsdict,outdir_folder,action,verbose)
+
+    return exportfaillist,annofaillist,bibfaillist,risfaillist
+
 
 
-        
 def processFolder(db,outdir,annotations,folderid,foldername,allfolders,action,\
-        separate,iszotero,verbose):
+        separate,iszotero,verbose,annorows=None,pool=None,cache=None,\
+        state=None,clip=False):
     '''Process files/docs in a folder.
 
     <db>: sqlite database.
@@ -995,6 +980,16 @@ def processFolder(db,outdir,annotations,folderid,foldername,allfolders,action,\
     <action>: list, possible elements: m, n, e, b.
     <separate>: bool, whether save one output for each file or all files.
     <iszotero>: bool, whether exported .bib is reformated to cater to zotero import or not.
+    <annorows>: dict or None, annotation rows of the folder, read from the
+                database beforehand (see MendeleyDB.loadAnnosByFolder()).
+                If None, query the database for the folder.
+    <pool>: ExtractPool obj or None, if given, export and extract
+            annotations from PDFs in its workers. See iterDocs().
+    <cache>: LayoutCache obj or None, cache of analysed page layouts.
+    <state>: ExportState obj or None, highlights of previous exports, for
+             incremental exports. See iterDocs().
+    <clip>: bool, if True, only analyse the layout of the text near the
+            highlights. See lib/clipdevice.py.
     '''
     
     exportfaillist=[]
@@ -1010,11 +1005,16 @@ def processFolder(db,outdir,annotations,folderid,foldername,allfolders,action,\
         isnote=True
 
     #------------Get raw annotation data------------
+    if annorows is None:
+        annorows={}
     if ishighlight:
-        annotations = getHighlights(db,annotations,folderid,foldername)
+        annotations = getHighlights(db,annotations,folderid,foldername,\
+                rows=annorows.get('highlights'))
     if isnote:
-        annotations = getNotes(db, annotations, folderid,foldername)
-        annotations = getDocNotes(db, annotations, folderid,foldername)
+        annotations = getNotes(db, annotations, folderid,foldername,\
+                rows=annorows.get('notes'))
+        annotations = getDocNotes(db, annotations, folderid,foldername,\
+                rows=annorows.get('docnotes'))
 
     if len(annotations)==0:
         printHeader('No annotations found in folder: %s' %foldername,2)
@@ -1032,95 +1032,47 @@ def processFolder(db,outdir,annotations,folderid,foldername,allfolders,action,\
     if not os.path.isdir(outdir_folder):
         os.makedirs(outdir_folder)
 
-    #-------------------Export PDFs-------------------
-    if 'p' in action:
-        if len(annotations)>0:
-            if verbose:
-                printHeader('Exporting annotated PDFs ...',2)
-            flist=exportpdf.exportAnnoPdf(annotations,\
-                    outdir_folder,verbose)
-            exportfaillist.extend(flist)
-    
-        #--------Copy other PDFs to target location--------
-        if len(otherdocs)>0:
-            if verbose:
-                printHeader('Exporting un-annotated PDFs ...',2)
-            flist=exportpdf.copyPdf(otherdocs,outdir_folder,verbose)
-            exportfaillist.extend(flist)
-
-    #----------Extract annotations from PDFs----------
+    #-----------Export docs with annotations-----------
     if len(annotations)>0:
+        flists=exportDocs(annotations,outdir,outdir_folder,allfolders,\
+                action,separate,iszotero,verbose,pool,cache,state,clip)
+        exportfaillist.extend(flists[0])
+        annofaillist.extend(flists[1])
+        bibfaillist.extend(flists[2])
+        risfaillist.extend(flists[3])
+
+    #--------Copy other PDFs to target location--------
+    if 'p' in action and len(otherdocs)>0:
         if verbose:
-            printHeader('Extracting annotations from PDFs ...',2)
-        annotations,flist=extractAnnos(annotations,action,verbose)
-        annofaillist.extend(flist)
-
-    #------------Export annotations to txt------------
-    if ('m' in action or 'n' in action) and len(annotations)>0:
-        if verbose:
-            printHeader('Exporting annotations to text file...',2)
-        flist=exportannotation.exportAnno(annotations,outdir_folder,action,\
-                separate,verbose)
-        annofaillist.extend(flist)
-
-        #--------Export annotations grouped by tags--------
-        tagsdict=extracttags.groupByTags(annotations)
-        extracttags.exportAnno(tagsdict,outdir_folder,action,verbose)
-
-    #----------Export meta and anno to bib file----------
-    if 'b' in action:
+            printHeader('Exporting un-annotated PDFs ...',2)
+        flist=exportpdf.copyPdf(otherdocs,outdir_folder,verbose)
+        exportfaillist.extend(flist)
 
+    #------Export other docs without annotations------
+    if 'b' in action and len(otherdocs)>0:
         if verbose:
-            printHeader('Exporting meta-data and annotations to .bib file...',2)
-
+            printHeader('Exporting meta-data of other docs to .bib file...',2)
         bibfolder=outdir if allfolders else outdir_folder
         isfile=True if 'p' in action else False
+        flist=export2bib.exportDoc2Bib(otherdocs,outdir,\
+            bibfolder,allfolders,isfile,iszotero,verbose)
+        bibfaillist.extend(flist)
 
-        #-----------Export docs with annotations-----------
-        if len(annotations)>0:
-            # <outdir> is the base folder to save outputs, specified by user
-            # <bibfolder> is the folder to save .bib file, which is <outdir> if <allfolders> is True,
-            # or <outdir>/<folder_tree> otherwise.
-            flist=export2bib.exportAnno2Bib(annotations,outdir,\
-                bibfolder,allfolders,isfile,iszotero,verbose)
-            bibfaillist.extend(flist)
-
-        #------Export other docs without annotations------
-        if len(otherdocs)>0:
-            flist=export2bib.exportDoc2Bib(otherdocs,outdir,\
-                bibfolder,allfolders,isfile,iszotero,verbose)
-            bibfaillist.extend(flist)
-
-    #----------Export meta and anno to ris file----------
-    if 'r' in action:
-
+    if 'r' in action and len(otherdocs)>0:
         if verbose:
-            printHeader('Exporting meta-data and annotations to .ris file...',2)
-
+            printHeader('Exporting meta-data of other docs to .ris file...',2)
         risfolder=outdir if allfolders else outdir_folder
         isfile=True if 'p' in action else False
-
-        #-----------Export docs with annotations-----------
-        if len(annotations)>0:
-            # <outdir> is the base folder to save outputs, specified by user
-            # <bibfolder> is the folder to save .bib file, which is <outdir> if <allfolders> is True,
-            # or <outdir>/<folder_tree> otherwise.
-            flist=export2ris.exportAnno2Ris(annotations,outdir,\
-                risfolder,allfolders,isfile,iszotero,verbose)
-            risfaillist.extend(flist)
-
-        #------Export other docs without annotations------
-        if len(otherdocs)>0:
-            flist=export2ris.exportDoc2Ris(otherdocs,outdir,\
-                risfolder,allfolders,isfile,iszotero,verbose)
-            risfaillist.extend(flist)
-
+        flist=export2ris.exportDoc2Ris(otherdocs,outdir,\
+            risfolder,allfolders,isfile,iszotero,verbose)
+        risfaillist.extend(flist)
 
     return exportfaillist,annofaillist,bibfaillist,risfaillist
 
     
 def processCanonicals(db,outdir,annotations,docids,allfolders,action,\
-        separate,iszotero,verbose):
+        separate,iszotero,verbose,annorows=None,pool=None,cache=None,\
+        state=None,clip=False):
     '''Process files/docs in a folder.
 
     <db>: sqlite database.
@@ -1132,6 +1084,17 @@ def processCanonicals(db,outdir,annotations,docids,allfolders,action,\
     <action>: list, possible elements: m, n, e, b.
     <separate>: bool, whether save one output for each file or all files.
     <iszotero>: bool, whether exported .bib is reformated to cater to zotero import or not.
+    <annorows>: dict or None, annotation rows of the canonical docs, read
+                from the database beforehand (see
+                MendeleyDB.loadAnnosByFolder()). If None, query the
+                database for <docids>.
+    <pool>: ExtractPool obj or None, if given, export and extract
+            annotations from PDFs in its workers. See iterDocs().
+    <cache>: LayoutCache obj or None, cache of analysed page layouts.
+    <state>: ExportState obj or None, highlights of previous exports, for
+             incremental exports. See iterDocs().
+    <clip>: bool, if True, only analyse the layout of the text near the
+            highlights. See lib/clipdevice.py.
     '''
     
     exportfaillist=[]
@@ -1147,12 +1110,17 @@ def processCanonicals(db,outdir,annotations,docids,allfolders,action,\
         isnote=True
 
     #------------Get raw annotation data------------
-    for ii,idii in enumerate(docids):
-        if ishighlight:
-            annotations=getHighlights(db,annotations,folderid=None,foldername=None,filterdocid=idii)
-        if isnote:
-            annotations=getNotes(db,annotations,folderid=None,foldername=None,filterdocid=idii)
-            annotations=getDocNotes(db,annotations,folderid=None,foldername=None,filterdocid=idii)
+    # All canonical docs are selected in one query per annotation kind
+    if annorows is None:
+        annorows={}
+    if ishighlight:
+        annotations=getHighlights(db,annotations,folderid=None,foldername=None,\
+                filterdocid=docids,rows=annorows.get('highlights'))
+    if isnote:
+        annotations=getNotes(db,annotations,folderid=None,foldername=None,\
+                filterdocid=docids,rows=annorows.get('notes'))
+        annotations=getDocNotes(db,annotations,folderid=None,foldername=None,\
+                filterdocid=docids,rows=annorows.get('docnotes'))
 
     if len(annotations)==0:
         print('\n# <Menotexport>: No annotations found among Canonical docs.')
@@ -1170,101 +1138,57 @@ def processCanonicals(db,outdir,annotations,docids,allfolders,action,\
     if not os.path.isdir(outdir_folder):
         os.makedirs(outdir_folder)
 
-    #-------------------Export PDFs-------------------
-    if 'p' in action:
-        if len(annotations)>0:
-            if verbose:
-                printHeader('Exporting annotated PDFs ...',2)
-            flist=exportpdf.exportAnnoPdf(annotations,\
-                    outdir_folder,verbose)
-            exportfaillist.extend(flist)
-    
-        #--------Copy other PDFs to target location--------
-        if len(otherdocs)>0:
-            if verbose:
-                printHeader('Exporting un-annotated PDFs ...',2)
-            flist=exportpdf.copyPdf(otherdocs,outdir_folder,verbose)
-            exportfaillist.extend(flist)
-
-    #----------Extract annotations from PDFs----------
+    #-----------Export docs with annotations-----------
     if len(annotations)>0:
+        flists=exportDocs(annotations,outdir,outdir_folder,allfolders,\
+                action,separate,iszotero,verbose,pool,cache,state,clip)
+        exportfaillist.extend(flists[0])
+        annofaillist.extend(flists[1])
+        bibfaillist.extend(flists[2])
+        risfaillist.extend(flists[3])
+
+    #--------Copy other PDFs to target location--------
+    if 'p' in action and len(otherdocs)>0:
         if verbose:
-            printHeader('Extracting annotations from PDFs ...',2)
-        annotations,flist=extractAnnos(annotations,action,verbose)
-        annofaillist.extend(flist)
-
-    #------------Export annotations to txt------------
-    if ('m' in action or 'n' in action) and len(annotations)>0:
-        if verbose:
-            printHeader('Exporting annotations to text file...',2)
-        flist=exportannotation.exportAnno(annotations,outdir_folder,action,\
-                separate,verbose)
-        annofaillist.extend(flist)
-
-        #--------Export annotations grouped by tags--------
-        tagsdict=extracttags.groupByTags(annotations)
-        extracttags.exportAnno(tagsdict,outdir_folder,action,verbose)
-
-    #----------Export meta and anno to bib file----------
-    if 'b' in action:
+            printHeader('Exporting un-annotated PDFs ...',2)
+        flist=exportpdf.copyPdf(otherdocs,outdir_folder,verbose)
+        exportfaillist.extend(flist)
 
+    #------Export other docs without annotations------
+    if 'b' in action and len(otherdocs)>0:
         if verbose:
-            printHeader('Exporting meta-data and annotations to .bib file...',2)
-
+            printHeader('Exporting meta-data of other docs to .bib file...',2)
         bibfolder=outdir if allfolders else outdir_folder
         isfile=True if 'p' in action else False
+        flist=export2bib.exportDoc2Bib(otherdocs,outdir,\
+            bibfolder,allfolders,isfile,iszotero,verbose)
+        bibfaillist.extend(flist)
 
-        #-----------Export docs with annotations-----------
-        if len(annotations)>0:
-            # <outdir> is the base folder to save outputs, specified by user
-            # <bibfolder> is the folder to save .bib file, which is <outdir> if <allfolders> is True,
-            # or <outdir>/<folder_tree> otherwise.
-            flist=export2bib.exportAnno2Bib(annotations,outdir,\
-                bibfolder,allfolders,isfile,iszotero,verbose)
-            bibfaillist.extend(flist)
-
-        #------Export other docs without annotations------
-        if len(otherdocs)>0:
-            flist=export2bib.exportDoc2Bib(otherdocs,outdir,\
-                bibfolder,allfolders,isfile,iszotero,verbose)
-            bibfaillist.extend(flist)
-
-    #----------Export meta and anno to ris file----------
-    if 'r' in action:
-
+    if 'r' in action and len(otherdocs)>0:
         if verbose:
-            printHeader('Exporting meta-data and annotations to .ris file...',2)
-
+            printHeader('Exporting meta-data of other docs to .ris file...',2)
         risfolder=outdir if allfolders else outdir_folder
         isfile=True if 'p' in action else False
-
-        #-----------Export docs with annotations-----------
-        if len(annotations)>0:
-            # <outdir> is the base folder to save outputs, specified by user
-            # <bibfolder> is the folder to save .bib file, which is <outdir> if <allfolders> is True,
-            # or <outdir>/<folder_tree> otherwise.
-            flist=export2ris.exportAnno2Ris(annotations,outdir,\
-                risfolder,allfolders,isfile,iszotero,verbose)
-            risfaillist.extend(flist)
-
-        #------Export other docs without annotations------
-        if len(otherdocs)>0:
-            flist=export2ris.exportDoc2Ris(otherdocs,outdir,\
-                risfolder,allfolders,isfile,iszotero,verbose)
-            risfaillist.extend(flist)
-
+        flist=export2ris.exportDoc2Ris(otherdocs,outdir,\
+            risfolder,allfolders,isfile,iszotero,verbose)
+        risfaillist.extend(flist)
 
     return exportfaillist,annofaillist,bibfaillist,risfaillist
 
 
 
 #----------------Bulk export to pdf----------------
-def main(dbfin,outdir,action,folder,separate,iszotero,verbose=True):
+def main(dbfin,outdir,action,folder,separate,iszotero,verbose=True,\
+        readonly=False,jobs=1,cachedir=None,incremental=False,clip=False,\
+        timeout=None,maxmem=None):
     
     try:
-        db = sqlite3.connect(dbfin)
+        db = mendeleydb.MendeleyDB(dbfin,readonly=readonly)
         if verbose:
-            printHeader('Connected to database:')
+            if readonly:
+                printHeader('Connected to database (read-only):')
+            else:
+                printHeader('Connected to database:')
             printInd(dbfin,2)
     except:
         printHeader('Failed to connect to database:')
@@ -1289,38 +1213,109 @@ def main(dbfin,outdir,action,folder,separate,iszotero,verbose=True):
     bibfaillist=[]
     risfaillist=[]
 
-    #---------------Loop through folders---------------
-    if len(folderlist)>0:
-        for ii,folderii in enumerate(folderlist):
-            fidii,fnameii=folderii
+    #-----Read annotations of all folders in one scan-----
+    if allfolders:
+        allannorows=db.loadAnnosByFolder(\
+                ishighlight='m' in action or 'p' in action,\
+                isnote='n' in action or 'p' in action)
+    else:
+        allannorows=None
+
+    #------------Open the layout cache------------
+    if cachedir is not None and 'm' in action:
+        cache=layoutcache.LayoutCache(cachedir)
+        if verbose:
+            printHeader('Using layout cache:')
+            printInd(cache.cachedir,2)
+    else:
+        cache=None
+
+    #----------Load state of previous exports----------
+    if incremental and 'm' in action:
+        from lib import extracthl2
+        method='pdftotext' if extracthl2.checkPdftotext() else 'pdfminer'
+        if clip:
+            method+='-clip'
+        if not os.path.isdir(outdir):
+            os.makedirs(outdir)
+        state=exportstate.ExportState(outdir,method)
+        if verbose:
+            printHeader('Incremental export, %d docs in previous state.'\
+                    %len(state.docs))
+    else:
+        state=None
+
+    #----Start workers for parallel or supervised extraction----
+    limited=timeout is not None or maxmem is not None
+    if (jobs>1 or limited) and ('m' in action or 'n' in action or\
+            'p' in action):
+        pool=ExtractPool(jobs,timeout,maxmem)
+        if verbose:
+            printHeader('Process PDFs with %d workers.' %jobs)
+            if timeout is not None:
+                printInd('Time limit per PDF: %g s' %timeout,2)
+            if maxmem is not None:
+                printInd('Memory limit per worker: %g MB' %maxmem,2)
+    else:
+        pool=None
+
+    completed=False
+    try:
+        #---------------Loop through folders---------------
+        if len(folderlist)>0:
+            for ii,folderii in enumerate(folderlist):
+                fidii,fnameii=folderii
+                if verbose:
+                    printNumHeader('Processing folder: "%s"' %fnameii,\
+                            ii+1,len(folderlist),1)
+                annotations={}
+                if allannorows is not None:
+                    annorowsii=allannorows.pop(fidii,None) or allannorows.default_factory()
+                else:
+                    annorowsii=None
+                exportfaillistii,annofaillistii,bibfaillistii,risfaillistii=\
+                        processFolder(db,outdir,annotations,\
+                    fidii,fnameii,allfolders,action,separate,iszotero,verbose,\
+                    annorowsii,pool,cache,state,clip)
+
+                exportfaillist.extend(exportfaillistii)
+                annofaillist.extend(annofaillistii)
+                bibfaillist.extend(bibfaillistii)
+                risfaillist.extend(risfaillistii)
+
+        #---------------Process canonical docs ------------
+        if folder is None and len(canonical_doc_ids)>0:
             if verbose:
-                printNumHeader('Processing folder: "%s"' %fnameii,\
-                        ii+1,len(folderlist),1)
+                printHeader('Processing docs under "My Library"')
             annotations={}
+            # Docs not in any folder are partitioned under None
+            annorowsii=allannorows.pop(None,None) or allannorows.default_factory()
             exportfaillistii,annofaillistii,bibfaillistii,risfaillistii=\
-                    processFolder(db,outdir,annotations,\
-                fidii,fnameii,allfolders,action,separate,iszotero,verbose)
+                    processCanonicals(db,outdir,annotations,\
+                    canonical_doc_ids,allfolders,action,separate,iszotero,verbose,\
+                    annorowsii,pool,cache,state,clip)
 
             exportfaillist.extend(exportfaillistii)
             annofaillist.extend(annofaillistii)
             bibfaillist.extend(bibfaillistii)
             risfaillist.extend(risfaillistii)
 
-    #---------------Process canonical docs ------------
-    if folder is None and len(canonical_doc_ids)>0:
-        if verbose:
-            printHeader('Processing docs under "My Library"')
-        annotations={}
-        exportfaillistii,annofaillistii,bibfaillistii,risfaillistii=\
-                processCanonicals(db,outdir,annotations,\
-                canonical_doc_ids,allfolders,action,separate,iszotero,verbose)
+            printHeader('NOTE that docs not belonging to any folder is saved to directory : "Canonical-My Library"')
 
-        exportfaillist.extend(exportfaillistii)
-        annofaillist.extend(annofaillistii)
-        bibfaillist.extend(bibfaillistii)
-        risfaillist.extend(risfaillistii)
+        completed=True
 
-        printHeader('NOTE that docs not belonging to any folder is saved to directory : "Canonical-My Library"')
+    finally:
+        if pool is not None:
+            pool.close()
+        # Save what was extracted, also if interrupted. Docs not seen are
+        # only dropped after a complete run over the whole library.
+        if state is not None:
+            state.save(prune=allfolders and completed)
+
+    if pool is not None and verbose:
+        pool.report()
+    if state is not None and verbose:
+        printHeader('Reused highlights of %d unchanged docs.' %state.nreused)
 
     #-----------------Close connection-----------------
     if verbose:
@@ -1359,11 +1354,6 @@ def main(dbfin,outdir,action,folder,separate,iszotero,verbose=True):
         if verbose:
             printHeader('All done.',2)
 
-    #-----------------Remove tmp file-----------------
-    if os.path.exists('tmp.txt'):
-	    os.remove('tmp.txt')
-
-
     return 0
 
 
@@ -1377,6 +1367,9 @@ def main(dbfin,outdir,action,folder,separate,iszotero,verbose=True):
 #-----------------------Main-----------------------
 if __name__ == "__main__":
 
+    # Needed by the extraction workers in frozen Windows executables
+    multiprocessing.freeze_support()
+
     parser = argparse.ArgumentParser(description=\
             'Export PDFs, highlights and notes from Mendeley database.')
 
@@ -1438,6 +1431,49 @@ if __name__ == "__main__":
             to facilitate import into Zotero.
             Only works when -b and/or -r are toggled.''')
 
+    parser.add_argument('--readonly', action='store_true',\
+            default=False,\
+            help='''Open the database read-only and without taking locks,
+            with memory-mapped reads. The export then doesn't block, and
+            isn't blocked by, a running Mendeley Desktop, but edits saved
+            by Mendeley during the export may be missed.''')
+
+    parser.add_argument('-j', '--jobs', type=int, default=1,\
+            help='''Number of processes to extract highlights and notes
+            from, and export, PDFs in parallel. Default to 1, process one
+            PDF after another.''')
+
+    parser.add_argument('--cache-dir', dest='cachedir', type=str,\
+            default=None,\
+            help='''Folder to keep the layout analysis of highlighted PDF
+            pages, so that later exports of unchanged PDFs skip the
+            analysis. Default to no cache.''')
+
+    parser.add_argument('-i', '--incremental', action='store_true',\
+            default=False,\
+            help='''Keep the extracted highlights in a state file in the
+            output folder, and reuse them in later exports for docs whose
+            highlights have not changed.''')
+
+    parser.add_argument('--clip-layout', dest='clip', action='store_true',\
+            default=False,\
+            help='''Only analyse the layout of the text near the
+            highlights, which is faster for pages with few highlights.
+            Highlights of a paragraph that are several lines apart may
+            then be exported separately.''')
+
+    parser.add_argument('--doc-timeout', dest='timeout', type=float,\
+            default=None,\
+            help='''Max time in seconds to spend on a PDF, to export it or
+            to extract its annotations. PDFs are then processed in worker
+            processes, a worker over the limit is killed and the PDF listed
+            as failed. Default to no limit.''')
+
+    parser.add_argument('--doc-memory', dest='maxmem', type=float,\
+            default=None,\
+            help='''Max memory in MB of a worker processing a PDF, as for
+            --doc-timeout. Only enforced on Linux. Default to no limit.''')
+
     parser.add_argument('-v', '--verbose', action='store_true',\
             default=True,\
             help='Print some texts.')
@@ -1452,7 +1488,9 @@ if __name__ == "__main__":
     outdir = os.path.abspath(args.outdir)
 
     main(dbfile,outdir,args.action,args.folder,\
-            args.separate,args.zotero,args.verbose)
+            args.separate,args.zotero,args.verbose,args.readonly,\
+            max(1,args.jobs),args.cachedir,args.incremental,args.clip,\
+            args.timeout,args.maxmem)
 
 
 
@@ -0,0 +1,130 @@
+'''Tests of reading and clipping highlights from pdftotext word boxes.
+
+Run from the repo root:
+
+    python -m unittest discover tests
+
+
+# Copyright 2016 Guang-zhi XU
+#
+# This file is distributed under the terms of the
+# GPLv3 licence. See the LICENSE file for details.
+# You may use, distribute and modify this code under the
+# terms of the GPLv3 license.
+
+Update time: 2026-10-18 20:21:05.
+'''
+
+import sys,os
+import unittest
+
+sys.path.insert(0,os.path.join(os.path.dirname(os.path.dirname(\
+        os.path.abspath(__file__))),'lib'))
+
+import extracthl2
+from pageindex import WordIndex
+from pdfminer.layout import LTTextBoxHorizontal, LTTextLineHorizontal
+
+
+# One line of 3 words, with y from 100 to 110
+WORDS=[(10.,100.,40.,110.,u'alpha'),\
+       (45.,100.,70.,110.,u'beta'),\
+       (75.,100.,110.,110.,u'gamma')]
+
+
+
+class FakePopen(object):
+    '''Stands for pdftotext cropping the line, records its args'''
+
+    calls=[]
+
+    def __init__(self,args,stdout=None,stderr=None):
+        FakePopen.calls.append(args)
+
+    def communicate(self):
+        return 'ta gam\n\x0c',''
+
+
+
+class TestWordIndex(unittest.TestCase):
+
+    def test_whole_words(self):
+        index=WordIndex(WORDS)
+        self.assertEqual(index.clip([5.,101.,72.,109.]),u'alpha beta')
+
+    def test_partial_word(self):
+        # Starts in the middle of "beta"
+        index=WordIndex(WORDS)
+        self.assertEqual(index.clip([55.,101.,110.,109.]),None)
+        # Ends in the middle of "gamma"
+        self.assertEqual(index.clip([5.,101.,90.,109.]),None)
+
+    def test_other_lines(self):
+        # Words of other lines don't prevent clipping
+        index=WordIndex(WORDS+[(50.,80.,90.,90.,u'below')])
+        self.assertEqual(index.clip([5.,101.,72.,109.]),u'alpha beta')
+
+
+
+class TestFindStrFromBox2(unittest.TestCase):
+
+    def setUp(self):
+        line=LTTextLineHorizontal(0.1)
+        line.set_bbox((10.,100.,110.,110.))
+        self.box=LTTextBoxHorizontal()
+        self.box.add(line)
+        FakePopen.calls=[]
+        self.popen=extracthl2.Popen
+        extracthl2.Popen=FakePopen
+
+    def tearDown(self):
+        extracthl2.Popen=self.popen
+
+    def find(self,rect):
+        anno=[{'rect':rect,'page':1,'cdate':None}]
+        return extracthl2.findStrFromBox2(anno,self.box,'doc.pdf',792.,\
+                words=WordIndex(WORDS),verbose=False)
+
+    def test_whole_words(self):
+        texts,num=self.find([5.,101.,72.,109.])
+        self.assertEqual(texts,u'alpha beta')
+        self.assertEqual(FakePopen.calls,[])
+
+    def test_partial_word(self):
+        # Cropped char by char by pdftotext, not by word boxes
+        texts,num=self.find([55.,101.,90.,109.])
+        self.assertEqual(texts,u'ta gam')
+        self.assertEqual(len(FakePopen.calls),1)
+        self.assertEqual(FakePopen.calls[0][8],str(550))
+
+
+
+
+class TestPagesWordBoxes(unittest.TestCase):
+
+    def setUp(self):
+        self.calls=[]
+        self.getwords=extracthl2.getWordBoxes
+        def getWordBoxes(filename,firstpage,lastpage,verbose=True):
+            self.calls.append((firstpage,lastpage))
+            return dict([(pp,[]) for pp in range(firstpage,lastpage+1)])
+        extracthl2.getWordBoxes=getWordBoxes
+
+    def tearDown(self):
+        extracthl2.getWordBoxes=self.getwords
+
+    def test_runs(self):
+        # Pages between highlighted ones are not read
+        words=extracthl2.getPagesWordBoxes('doc.pdf',[880,3,4,5,3])
+        self.assertEqual(self.calls,[(3,5),(880,880)])
+        self.assertEqual(sorted(words.keys()),[3,4,5,880])
+
+    def test_failure(self):
+        extracthl2.getWordBoxes=lambda *args: None
+        self.assertEqual(extracthl2.getPagesWordBoxes('doc.pdf',[1,9]),None)
+
+
+
+
+if __name__=='__main__':
+    unittest.main()